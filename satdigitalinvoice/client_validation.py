@@ -1,20 +1,57 @@
 import logging
 import re
 import warnings
+from concurrent.futures import ThreadPoolExecutor, Future
+from datetime import datetime, timedelta
 
 from bs4.builder import XMLParsedAsHTMLWarning
 from satcfdi.models import RFC, RFCType
 from satcfdi import csf
-from satcfdi.pacs.sat import SAT
 
-sat_service = SAT()
+from .listado_69b import listado_69b
+from .utils import record_hash
+
 logger = logging.getLogger(__name__)
 warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
 
 EMAIL_REGEX = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,7}\b'
+CLIENT_VALIDATION_WORKERS = 8
+CLIENT_VALIDATION_TTL = timedelta(days=30)
+
+
+def retrieve_csf(rfc: str, id_cif: str, local_db=None) -> dict:
+    # constancias are reused from local_db until they expire
+    if local_db is not None and (res := local_db.csf(rfc, id_cif)) is not None:
+        return res
+
+    res = csf.retrieve(rfc, id_cif=id_cif)
+    if local_db is not None:
+        local_db.csf_set(rfc, id_cif, res)
+    return res
+
+
+def validar_clientes(clients, local_db=None, max_workers=CLIENT_VALIDATION_WORKERS) -> list[Future]:
+    # validates the clients concurrently, each future returns the errors of its client
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="validar_client")
+    try:
+        return [executor.submit(validar_client, client, local_db) for client in clients]
+    finally:
+        executor.shutdown(wait=False)
+
+
+def clientes_pendientes(clients, local_db, ttl=CLIENT_VALIDATION_TTL) -> list:
+    # clients edited since their last validation, never validated, expired or with errors
+    def pendiente(client):
+        v = local_db.client_validation(client['Rfc'])
+        return v is None \
+            or v['errors'] \
+            or v['hash'] != record_hash(client) \
+            or v['timestamp'] + ttl < datetime.now()
+
+    return [c for c in clients if pendiente(c)]
 
 
-def validar_client(client):
+def validar_client(client, local_db=None):
     errors = []
 
     rfc = client['Rfc']
@@ -29,7 +66,7 @@ def validar_client(client):
             if not re.fullmatch(EMAIL_REGEX, email):
                 error(f"Correo '{email}' is invalid")
 
-        res = csf.retrieve(rfc, id_cif=client["IdCIF"])
+        res = retrieve_csf(client['Rfc'], id_cif=client["IdCIF"], local_db=local_db)
 
         if rfc.type == RFCType.FISICA:
             razon_social = f"{res['Nombre']} {res['Apellido Paterno']} {res['Apellido Materno']}"
@@ -58,12 +95,14 @@ def validar_client(client):
         if res['Situación del contribuyente'] not in ('ACTIVO', 'REACTIVADO'):
             error(f"Is not ACTIVO '{res['Situación del contribuyente']}'")
 
-        taxpayer_status = sat_service.list_69b(rfc)
+        taxpayer_status = listado_69b.status(rfc)
         if taxpayer_status:
             error(f"has status '{taxpayer_status}'")
     except Exception as ex:
         error(ex)
 
+    if local_db is not None:
+        local_db.client_validation_set(client['Rfc'], record_hash(client), errors)
     return errors
 
 
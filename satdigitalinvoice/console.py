@@ -0,0 +1,119 @@
+import logging
+import os
+import sys
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+CONSOLE_FLUSH_INTERVAL = 250  # milliseconds between console updates
+CONSOLE_MAX_LINES = 5000  # lines kept in the console, the full output goes to the log file
+CONSOLE_LOG_FILE = "console.log"
+CONSOLE_LOG_MAX_BYTES = 5 * 1024 * 1024  # the log file is rotated to console.log.1 when it reaches this size
+
+
+class ConsoleWriter:
+    """
+    Buffered stdout for the console element.
+
+    print() only appends to a buffer and to the log file, the GUI thread moves the buffer to the
+    element every interval milliseconds and trims it to the last max_lines lines.
+    The log file keeps one backup, it is rotated once it reaches max_bytes.
+    """
+
+    def __init__(self, element, log_file=None, interval=CONSOLE_FLUSH_INTERVAL, max_lines=CONSOLE_MAX_LINES,
+                 max_bytes=CONSOLE_LOG_MAX_BYTES):
+        self.element = element
+        self.interval = interval
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.previous_stdout = None
+        self.stopped = False
+
+        self.log = None
+        self.log_file = None
+        if log_file:
+            self.open_log(log_file)
+
+    def open_log(self, log_file):
+        # relative paths are resolved now, call it again after changing the working directory
+        log_file = os.path.abspath(log_file)
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        with self.lock:
+            self._close_log()
+            self.log_file = log_file
+            self.log = open(log_file, 'a', encoding='utf-8')
+            self.log.write(f"\n--- {datetime.now().replace(microsecond=0)} ---\n")
+
+    def start(self):
+        self.previous_stdout = sys.stdout
+        sys.stdout = self
+        self._schedule()
+
+    def stop(self):
+        self.stopped = True
+        if self.previous_stdout:
+            sys.stdout = self.previous_stdout
+            self.previous_stdout = None
+        with self.lock:
+            self._close_log()
+
+    def write(self, txt):
+        with self.lock:
+            self.buffer.append(txt)
+            self._write_log(txt)
+        return len(txt)
+
+    def flush(self):
+        # the element is updated on the next tick
+        with self.lock:
+            if self.log:
+                self.log.flush()
+
+    def set(self, txt):
+        # replaces the console content, pending output is discarded
+        with self.lock:
+            self.buffer.clear()
+            self._write_log(txt)
+        self.element.update(txt)
+
+    def flush_console(self):
+        with self.lock:
+            txt = "".join(self.buffer)
+            self.buffer.clear()
+        if txt:
+            self.element.update(txt, append=True)
+            self._trim()
+
+    def _write_log(self, txt):
+        if not self.log:
+            return
+        if self.log.tell() >= self.max_bytes:
+            self.log.close()
+            os.replace(self.log_file, self.log_file + ".1")
+            self.log = open(self.log_file, 'a', encoding='utf-8')
+        self.log.write(txt)
+
+    def _close_log(self):
+        if self.log:
+            self.log.close()
+            self.log = None
+
+    def _trim(self):
+        widget = self.element.Widget
+        lines = int(widget.index('end-1c').split('.')[0])
+        if lines > self.max_lines:
+            widget.delete('1.0', f'{lines - self.max_lines + 1}.0')
+
+    def _schedule(self):
+        if not self.stopped:
+            self.element.Widget.after(self.interval, self._tick)
+
+    def _tick(self):
+        try:
+            self.flush_console()
+        except Exception:
+            logger.exception("Error al actualizar la consola")
+        self._schedule()
@@ -1,6 +1,13 @@
 import base64
 import imaplib
+import os
+import queue
 import smtplib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from email import encoders
 from email.mime.application import MIMEApplication
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
@@ -9,11 +16,23 @@ import email
 import email.utils
 import logging
 
+from .exceptions import ConsoleErrors
+
 logger = logging.getLogger(__name__)
 
+SMTP_MAX_CONNECTIONS = 3  # Office 365 accepts up to 3 concurrent connections per mailbox, the rate limiter bounds the total
+SMTP_ATTEMPTS = 3  # a message is sent again on a new session after a disconnect or a 4xx reply
+SMTP_MAX_RATE = 0.5  # messages per second, Office 365 accepts 30 messages per minute per mailbox
+SMTP_MIN_RATE = 0.05
+SMTP_RATE_INCREASE = 0.02  # added to the rate after every delivered message
+SMTP_BURST = 5
+THROTTLING_CODES = (421, 432, 450, 451, 452)
+ATTACHMENT_CACHE_SIZE = 64 * 1024 * 1024  # bytes of encoded attachments kept in memory
+
 
 class EmailManager:
-    def __init__(self, stmp_host, stmp_port, imap_host, imap_port, user, password=None, xoauth2_token=None):
+    def __init__(self, stmp_host, stmp_port, imap_host, imap_port, user, password=None, xoauth2_token=None, max_connections=SMTP_MAX_CONNECTIONS, starttls=True,
+                 max_rate=SMTP_MAX_RATE):
         # self.receiver = EmailReceiver(
         #     host=imap_host,
         #     port=imap_port,
@@ -26,7 +45,10 @@ class EmailManager:
             port=stmp_port,
             user=user,
             password=password,
-            xoauth2_token=xoauth2_token
+            xoauth2_token=xoauth2_token,
+            max_connections=max_connections,
+            starttls=starttls,
+            max_rate=max_rate,
         )
 
 
@@ -104,33 +126,266 @@ def generate_oauth2_string(username, access_token) -> str:
     return base64.b64encode(auth_string.encode()).decode()
 
 
+class AttachmentCache:
+    """ Base64 encoded attachments, least recently used are dropped over max_size """
+
+    def __init__(self, max_size=ATTACHMENT_CACHE_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path) -> str:
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        with self.lock:
+            if (encoded := self.items.get(key)) is not None:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return encoded
+            self.misses += 1
+
+        with open(path, "rb") as fil:
+            encoded = base64.encodebytes(fil.read()).decode('ascii')
+
+        if len(encoded) <= self.max_size:
+            with self.lock:
+                if key not in self.items:
+                    self.items[key] = encoded
+                    self.size += len(encoded)
+                while self.size > self.max_size:
+                    _, dropped = self.items.popitem(last=False)
+                    self.size -= len(dropped)
+        return encoded
+
+    def stats(self) -> dict:
+        return {"Hits": self.hits, "Misses": self.misses, "Size": self.size}
+
+
+attachment_cache = AttachmentCache()
+
+
+def attachment_part(path) -> MIMEApplication:
+    part = MIMEApplication(b'', Name=basename(path), _encoder=encoders.encode_noop)
+    part.set_payload(attachment_cache.get(path))
+    part['Content-Transfer-Encoding'] = 'base64'
+    part['Content-Disposition'] = 'attachment; filename="%s"' % basename(path)
+    return part
+
+
+class RateLimiter:
+    """
+    Token bucket shared by the SMTP sessions, the rate is halved on throttling replies
+    and grows back by rate_increase after every delivered message.
+    """
+
+    def __init__(self, max_rate, burst=SMTP_BURST, min_rate=SMTP_MIN_RATE, rate_increase=SMTP_RATE_INCREASE):
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.burst = burst
+        self.min_rate = min(min_rate, max_rate)
+        self.rate_increase = rate_increase
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def throttled(self):
+        with self.lock:
+            self.rate = max(self.rate / 2, self.min_rate)
+            self.tokens = 0
+
+    def delivered(self):
+        with self.lock:
+            self.rate = min(self.rate + self.rate_increase, self.max_rate)
+
+
+def is_throttled(ex) -> bool:
+    # 4.7.x and 4.3.2 are sent by Office 365 when the mailbox exceeds its limits
+    return isinstance(ex, smtplib.SMTPResponseException) and (
+            ex.smtp_code in THROTTLING_CODES
+            or b'4.7.' in ex.smtp_error
+            or b'4.3.2' in ex.smtp_error
+    )
+
+
+def is_permanent(ex) -> bool:
+    # 5xx replies, sending the message again gets the same answer
+    if isinstance(ex, smtplib.SMTPRecipientsRefused):
+        return bool(ex.recipients) and all(500 <= code < 600 for code, _ in ex.recipients.values())
+    return isinstance(ex, smtplib.SMTPResponseException) and 500 <= ex.smtp_code < 600
+
+
+def is_transient(ex) -> bool:
+    # errors after which the message can be sent again on a new session
+    if isinstance(ex, smtplib.SMTPResponseException):
+        return 400 <= ex.smtp_code < 500
+    return isinstance(ex, (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError))
+
+
 class EmailSender:
-    def __init__(self, host, port, user, password, xoauth2_token=None):
+    """
+    Sends messages through a pool of up to max_connections SMTP sessions.
+
+    send_email only queues the message and returns a Future, leaving the block waits for every
+    queued message and raises ConsoleErrors with the ones that could not be sent.
+    Messages are sent at most at max_rate per second, the throughput of each batch is logged.
+    """
+
+    def __init__(self, host, port, user, password, xoauth2_token=None, max_connections=SMTP_MAX_CONNECTIONS, starttls=True, max_rate=SMTP_MAX_RATE):
         self.host = host
         self.port = port
         self.user = user
         self.password = password
         self.xoauth2_token = xoauth2_token
+        self.max_connections = max_connections
+        self.starttls = starttls
+        self.rate_limiter = RateLimiter(max_rate)
+
+        self.queue = None
+        self.workers = []
+        self.futures = []
+        self.idle = 0
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.started = None
+
+    def connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(host=self.host, port=self.port)
+        try:
+            if self.starttls:
+                server.starttls()  # Puts connection to SMTP server in TLS mode
+
+            if self.xoauth2_token:
+                server.ehlo_or_helo_if_needed()
+                code, resp = self.auth_xoauth2(server, self.xoauth2_token())
+                if code != 235:
+                    # the cached token was rejected, it is refreshed once
+                    code, resp = self.auth_xoauth2(server, self.xoauth2_token(force_refresh=True))
+                if code != 235:
+                    raise smtplib.SMTPAuthenticationError(code, resp)
+            else:
+                server.login(
+                    user=self.user,
+                    password=self.password
+                )
+        except:
+            server.close()
+            raise
+        return server
+
+    def auth_xoauth2(self, server, token):
+        code, resp = server.docmd('AUTH', 'XOAUTH2 ' + generate_oauth2_string(self.user, token))
+        if code == 334:
+            # the error details are sent as a challenge, an empty reply completes the exchange
+            code, resp = server.docmd('')
+        return code, resp
 
     def __enter__(self):
-        self.server = smtplib.SMTP(host=self.host, port=self.port)
-        self.server.starttls()  # Puts connection to SMTP server in TLS mode
-
-        if self.xoauth2_token:
-            self.server.ehlo_or_helo_if_needed()
-            self.server.docmd('AUTH', 'XOAUTH2 ' + generate_oauth2_string(self.user, self.xoauth2_token()))
-        else:
-            self.server.login(
-                user=self.user,
-                password=self.password
-            )
+        self.queue = queue.Queue()
+        self.workers = []
+        self.futures = []
+        self.idle = 0
+        self.stats = {"messages": 0, "bytes": 0, "retries": 0, "throttled": 0}
+        self.started = time.monotonic()
         return self
 
     # exc_type, exc, exc_tb
     def __exit__(self, exc_type, exc, exc_tb):
-        self.server.close()
+        if exc_type:
+            for f in self.futures:
+                f.cancel()
+
+        for _ in self.workers:
+            self.queue.put(None)
+        for w in self.workers:
+            w.join()
+        self.log_stats()
 
-    def send_email(self, subject: str, to_addrs: list, html: str = None, file_attachments=None):
+        if not exc_type:
+            errors = [
+                f"{f.subject}: {f.exception()}" for f in self.futures if not f.cancelled() and f.exception()
+            ]
+            if errors:
+                raise ConsoleErrors("Errores al enviar correos", errors=errors)
+
+    def log_stats(self):
+        if not self.futures:
+            return
+        elapsed = max(time.monotonic() - self.started, 1e-3)
+        logger.info(
+            "Correos enviados: %d de %d en %.1fs, %.2f msg/s, %.0f bytes/s, reintentos: %d, limitados: %d, tasa: %.2f msg/s",
+            self.stats["messages"], len(self.futures), elapsed,
+            self.stats["messages"] / elapsed, self.stats["bytes"] / elapsed,
+            self.stats["retries"], self.stats["throttled"], self.rate_limiter.rate
+        )
+
+    def _count(self, name, value=1):
+        with self.lock:
+            self.stats[name] += value
+
+    def _worker(self):
+        server = None
+        try:
+            while (item := self._next()) is not None:
+                msg, to_addrs, data, future = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    server = self._send(server, to_addrs, data)
+                    self._count("messages")
+                    self._count("bytes", len(data))
+                    future.set_result(msg['To'])
+                except Exception as ex:
+                    logger.exception("Error al enviar correo: %s", msg['Subject'])
+                    future.set_exception(ex)
+        finally:
+            if server:
+                server.close()
+
+    def _next(self):
+        with self.lock:
+            self.idle += 1
+        try:
+            return self.queue.get()
+        finally:
+            with self.lock:
+                self.idle -= 1
+
+    def _send(self, server, to_addrs, data) -> smtplib.SMTP:
+        for attempt in range(1, SMTP_ATTEMPTS + 1):
+            self.rate_limiter.acquire()
+            try:
+                server = server or self.connect()
+                server.sendmail(self.user, to_addrs, data)
+                self.rate_limiter.delivered()
+                return server
+            except Exception as ex:
+                if server:
+                    server.close()
+                    server = None
+                if is_throttled(ex):
+                    self.rate_limiter.throttled()
+                    self._count("throttled")
+                if attempt == SMTP_ATTEMPTS or not is_transient(ex):
+                    raise
+                self._count("retries")
+                logger.warning("Reconectando SMTP: %s", ex)
+
+    def send_email(self, subject: str, to_addrs: list, html: str = None, file_attachments=None) -> Future:
         msg = MIMEMultipart()
         msg['From'] = self.user
         msg['To'] = ", ".join(to_addrs)
@@ -139,15 +394,21 @@ class EmailSender:
             msg.attach(MIMEText(html, _subtype='html'))
 
         for f in file_attachments or []:
-            with open(f, "rb") as fil:
-                part = MIMEApplication(
-                    fil.read(),
-                    Name=basename(f)
-                )
-            # After the file is closed
-            part['Content-Disposition'] = 'attachment; filename="%s"' % basename(f)
-            msg.attach(part)
+            # the same files are attached to several messages, they are encoded only once
+            msg.attach(attachment_part(f))
 
-        self.server.send_message(
-            msg=msg
-        )
+        # serialized once, its size is counted in the batch throughput
+        data = msg.as_bytes(policy=msg.policy.clone(linesep='\r\n'))
+
+        future = Future()
+        future.subject = subject
+        self.futures.append(future)
+
+        # a new session is opened only when the running ones are busy
+        with self.lock:
+            if len(self.workers) < self.max_connections and self.queue.qsize() >= self.idle:
+                worker = threading.Thread(target=self._worker, name="smtp", daemon=True)
+                worker.start()
+                self.workers.append(worker)
+        self.queue.put((msg, list(to_addrs), data, future))
+        return future
@@ -1,14 +1,26 @@
+import os
 from datetime import date
+from functools import lru_cache
 from html import escape as html_escape
 
 import jinja2
-from jinja2 import Environment, Undefined
+from jinja2 import Environment, Template, Undefined
 from jinja2.filters import do_mark_safe
 from satcfdi import render as cfdi_render
 from satcfdi.transform.helpers import iterate as h_iterate
 import satdigitalinvoice.formatting_functions.common as common
 
-from . import TEMPLATES_DIRECTORY
+from . import TEMPLATES_DIRECTORY, DATA_DIRECTORY
+
+BYTECODE_CACHE_DIRECTORY = os.path.join(DATA_DIRECTORY, "jinja")
+STRING_TEMPLATE_CACHE_SIZE = 512
+
+
+class BytecodeCache(jinja2.FileSystemBytecodeCache):
+    # the project directory can change at runtime, create the cache folder lazily
+    def dump_bytecode(self, bucket):
+        os.makedirs(self.directory, exist_ok=True)
+        super().dump_bytecode(bucket)
 
 
 class FacturacionEnvironment(Environment):
@@ -35,7 +47,9 @@ class FacturacionEnvironment(Environment):
             trim_blocks=True,
             lstrip_blocks=True,
             undefined=jinja2.StrictUndefined,
+            bytecode_cache=BytecodeCache(directory=BYTECODE_CACHE_DIRECTORY),
         )
+        self._string_templates = lru_cache(maxsize=STRING_TEMPLATE_CACHE_SIZE)(self.from_string)
 
         @self.glob
         def iterate(v):
@@ -86,6 +100,9 @@ class FacturacionEnvironment(Environment):
         def html_str(cdfi):
             return cfdi_render.html_str(cdfi)
 
+    def from_string_cached(self, source: str) -> Template:
+        return self._string_templates(source)
+
 
 def tag(text, tag):
     return '<' + tag + '>' + text + '</' + tag + '>'
@@ -1,10 +1,12 @@
 import base64
+import bisect
 import csv
 import io
 import itertools
 import logging
 import os
 import re
+import time
 from datetime import date, datetime
 from uuid import UUID
 from zipfile import ZipFile
@@ -14,7 +16,6 @@ from satcfdi import csf, render
 
 from satcfdi.accounting.models import EstadoComprobante
 from satcfdi.accounting.process import complement_invoices
-from satcfdi.create.cfd import cfdi40
 from satcfdi.create.cfd.catalogos import MetodoPago, TipoDeComprobante
 from satcfdi.exceptions import ResponseError
 from satcfdi.models import DatePeriod
@@ -22,11 +23,13 @@ from satcfdi.pacs import Accept
 from satcfdi.pacs.sat import SAT, EstadoSolicitud
 from xlsxwriter.exceptions import XlsxFileError
 
-from . import __version__, ARCHIVOS_DIRECTORY, DATA_DIRECTORY, METADATA_FILE, PAQUETE_FILE
-from .client_validation import validar_client, clientes_generar_txt
+from . import __version__, ARCHIVOS_DIRECTORY, DATA_DIRECTORY, LOGS_DIRECTORY, METADATA_FILE, PAQUETE_FILE
+from .console import ConsoleWriter, CONSOLE_LOG_FILE
+from .client_validation import validar_clientes, clientes_pendientes, clientes_generar_txt
 from .environments import facturacion_environment
-from .file_data_managers import ClientsManager, FacturasManager, ProductosManager
-from .gui_functions import generate_ingresos, pago_factura, archivos_folder, period_desc, parse_fecha_pago, parse_importe_pago, preview_cfdis, center_location, \
+from .file_data_managers import ClientsManager, FacturasManager, ProductosManager, ConfigManager, data_sources, client_validation, factura_validation, \
+    product_validation
+from .gui_functions import generate_ingresos, pago_facturas, group_pagos, saldo_pendiente_pagos, archivos_folder, period_desc, parse_fecha_pago, parse_importe_pago, preview_cfdis, center_location, \
     CALENDAR_FECHA_FMT, ConsoleErrors, \
     generate_ajustes, generar_depositos, cliente_prediales
 from .initdb import InitDB
@@ -34,15 +37,47 @@ from .layout import make_layout, ActionButtonManager, TipoRecuperar, TipoDocumen
 from .localdb import LocalDB
 from .log_tools import header_line, print_yaml, to_yaml
 from .mycfdi import MyCFDI, LiquidatedState
-from .prediales import process_predial
+from .prediales import process_prediales
+from .registry import load_emisores, load_pac_services
+from .stamping import StampingPipeline, STAMP_WORKERS
 from .email import EmailManager
-from .utils import random_string, to_date_period, load_certificate, to_int, cert_info, add_month, to_uuid, open_file, OS, first_duplicate
+from .outbox import Outbox
+from .listado_69b import listado_69b
+from .http_sessions import http_sessions, patch_satcfdi
+from .jobs import JobExecutor, JOB_PROGRESS, JOB_PRINT, JOB_PARTIAL, JOB_DONE
+from .utils import to_date_period, to_int, cert_info, add_month, to_uuid, open_file, OS, first_duplicate
+
+patch_satcfdi()
 
 logging.getLogger("weasyprint").setLevel(logging.ERROR)
 logging.getLogger("fontTools").setLevel(logging.ERROR)
 
 logger = logging.getLogger(__name__)
 
+# data files each tab is built from, the tab is rebuilt on focus only when one of them changes
+TAB_DATA_SOURCES = {
+    'productos_tab': (ConfigManager.file_source, ProductosManager.file_source),
+    'clientes_tab': (ConfigManager.file_source, ClientsManager.file_source),
+    'facturas_tab': (ConfigManager.file_source, ClientsManager.file_source, FacturasManager.file_source, ProductosManager.file_source),
+    'ajustes_tab': (ConfigManager.file_source, ClientsManager.file_source, FacturasManager.file_source, ProductosManager.file_source),
+    'depositos_tab': (ConfigManager.file_source, ClientsManager.file_source, FacturasManager.file_source, ProductosManager.file_source),
+}
+# tabs that also depend on LocalDB and the invoices, they are rebuilt on every focus
+TAB_ALWAYS_RELOAD = ('correos_tab',)
+
+LOAD_INVOICES_JOB = "Cargando Facturas"
+RECOVER_STAMPS_JOB = "Recuperando Facturas"
+EMITIDAS_SEARCH_JOB = "Buscando Emitidas"
+RECIBIDAS_SEARCH_JOB = "Buscando Recibidas"
+# events posted from other threads, handled even while an action is polling the window
+BACKGROUND_EVENTS = (JOB_PROGRESS, JOB_PRINT, JOB_PARTIAL, JOB_DONE, "outbox_delivered", "outbox_failed", "outbox_rejected")
+SEARCH_BATCH_INTERVAL = 0.2  # seconds between result batches pushed to the table
+SEARCH_TIME_BUDGET = 3  # seconds of streaming, later results are only counted and shown on demand
+
+
+def invoice_date_key(i):
+    return i["Fecha"], i.get('Serie'), i.get('Folio')
+
 
 def get_directory():
     sg.theme('Default1')
@@ -82,13 +117,16 @@ class FacturacionGUI:
         self.init_db.set_cwd()
 
         self.email_manager = None
+        self.outbox = None
         self._all_invoices = None
+        self._invoices_by_date = None
+        self._search_rest = {}
         self.local_db = None
         self.rfc_prediales = None
         self.emisores = {"Test": "Test"}
         self.pac_services = {}
+        self.stamp_workers = STAMP_WORKERS
         self.email_signature = None
-        self.config_last_modified = None
         self.proveedores = {}
 
         self.window = sg.Window(
@@ -106,11 +144,15 @@ class FacturacionGUI:
         )
         self.has_focus = True
 
+        self.jobs = JobExecutor(on_event=self.window.write_event_value)
+
         self.action_button_manager = ActionButtonManager(
             button=self.window["crear_facturas"],
             preview=self.window["ver_preview"],
         )
         self.console = self.window["console"]
+        self.console_writer = ConsoleWriter(self.console, log_file=os.path.join(LOGS_DIRECTORY, CONSOLE_LOG_FILE))
+        self.console_writer.start()
 
         self.window.bind("<FocusIn>", "_focus_in")
         self.window.bind("<FocusOut>", "_focus_out")
@@ -133,45 +175,18 @@ class FacturacionGUI:
 
     @staticmethod
     def read_config():
-        from satdigitalinvoice.file_data_managers import ConfigManager
         return ConfigManager()
 
     def load_config(self, force=False):
-        config = self.read_config()
-        if isinstance(config, dict):
-            last_modified = True
-        else:
-            last_modified = config.last_modified()
-        if self.config_last_modified == last_modified and not force:
+        if not data_sources.changed('config', [ConfigManager.file_source]) and not force:
             return
-        self.config_last_modified = last_modified
-
-        pac = config['pac']
-
-        def load_pac(pac_config):
-            pac_module, pac_class = pac_config['type'].split(".")
-            mod = __import__(f"satcfdi.pacs.{pac_module}", fromlist=[pac_class])
-            return getattr(mod, pac_class)(**pac_config['args'])
-
-        # Per-RFC pac configuration
-        self.pac_services = {
-            rfc: load_pac(pac_config) for rfc, pac_config in pac.items()
-        }
-
-        def load_emisor(data):
-            return {
-                "csd": load_certificate(data['csd']),
-                "fiel": load_certificate(data['fiel']) if 'fiel' in data else None,
-            }
+        config = self.read_config()
 
-        if emisores := config.get('emisores'):
-            self.emisores = {
-                rfc: load_emisor(csd) for rfc, csd in emisores.items()
-            }
-        else:
-            self.emisores = None
+        self.pac_services = load_pac_services(config)
+        self.emisores = load_emisores(config)
 
         self.rfc_prediales = config['rfc_prediales']
+        self.stamp_workers = config.get('stamp_workers', STAMP_WORKERS)
 
         self.local_db = LocalDB(base_path=DATA_DIRECTORY)
 
@@ -182,8 +197,17 @@ class FacturacionGUI:
 
         self.email_manager = EmailManager(
             **config['email'],
-            xoauth2_token=lambda: self.local_db.get_email_token()['access_token']
+            xoauth2_token=lambda force_refresh=False: self.local_db.get_email_token(force_refresh)['access_token']
         )
+        previous = self.outbox
+        if previous:
+            previous.stop()
+        self.outbox = Outbox(
+            local_db=self.local_db,
+            sender=self.email_manager.sender,
+            on_event=self.window.write_event_value
+        )
+        self.outbox.start(previous)
         self.email_signature = config['email_signature']
 
         emisores = list(self.emisores.keys())
@@ -195,6 +219,8 @@ class FacturacionGUI:
 
     def run(self):
         self.main_loop()
+        self.jobs.shutdown()
+        self.console_writer.stop()
         self.window.close()
 
     def initial_screen(self):
@@ -218,65 +244,173 @@ class FacturacionGUI:
             "facturacion": "CFDI 4.0",
             "pac_service": {rfc: pac_info(svc) for rfc, svc in self.pac_services.items()},
             "emisores": {rfc: emisor_info(data) for rfc, data in self.emisores.items()},
+            "validacion_cache": {
+                "clientes": client_validation.stats(),
+                "facturas": factura_validation.stats(),
+                "productos": product_validation.stats(),
+            },
+            "correos_pendientes": self.outbox.pending() if self.outbox else 0,
+            "http": http_sessions.stats(),
         })
 
     def get_all_invoices(self):
         if not self._all_invoices:
-            self._all_invoices = MyCFDI.get_all_cfdi()
+            if (job := self.jobs.get(LOAD_INVOICES_JOB)) and not job.cancelled:
+                # already being loaded in the background
+                self._all_invoices = job.future.result()
+            else:
+                self._all_invoices = MyCFDI.get_all_cfdi()
         return self._all_invoices
 
+    def load_invoices(self):
+        job = self.jobs.get(LOAD_INVOICES_JOB)
+        if self._all_invoices is None and (not job or job.cancelled):
+            self.jobs.submit(LOAD_INVOICES_JOB, lambda job: MyCFDI.get_all_cfdi(), on_done=self._invoices_loaded)
+
+    def _invoices_loaded(self, all_invoices):
+        if self._all_invoices is None:
+            self._all_invoices = all_invoices
+
+    def invalidate_invoices(self):
+        self._all_invoices = None
+        self.jobs.cancel(LOAD_INVOICES_JOB)
+
+    def invoices_by_date(self):
+        # date index, rebuilt when the invoices are reloaded
+        all_invoices = self.get_all_invoices()
+        if not self._invoices_by_date or self._invoices_by_date[0] is not all_invoices:
+            self._invoices_by_date = all_invoices, sorted(all_invoices.values(), key=invoice_date_key)
+        return self._invoices_by_date[1]
+
+    def iter_invoices(self, job):
+        for i in self.invoices_by_date():
+            job.check()
+            yield i
+
+    def stream_search(self, name, table, fact_iter, prepare=None, on_done=None):
+        # results come in date order, batches are appended to the table as they are found
+        self.window[table].update(values=[])
+        self.window[f"{table}_mas"].update(visible=False)
+        self._search_rest.pop(table, None)
+
+        def search(job):
+            # the budget starts once the invoices are loaded and indexed and the search is prepared
+            self.invoices_by_date()
+            if prepare:
+                prepare(job)
+            deadline = time.monotonic() + SEARCH_TIME_BUDGET
+            next_batch = time.monotonic() + SEARCH_BATCH_INTERVAL
+            batch, rest = [], []
+            for i in fact_iter(job):
+                if rest or time.monotonic() > deadline:
+                    if batch:
+                        job.partial(batch)
+                        batch = []
+                    rest.append(i)
+                else:
+                    batch.append(i)
+                    if time.monotonic() >= next_batch:
+                        job.partial(batch)
+                        batch = []
+                        next_batch = time.monotonic() + SEARCH_BATCH_INTERVAL
+            if batch:
+                job.partial(batch)
+            return rest
+
+        def search_done(rest):
+            if rest:
+                self._search_rest[table] = rest
+                self.window[f"{table}_mas"].update(f"{len(rest)} más", visible=True)
+            if on_done:
+                on_done()
+
+        # a new search replaces the one still running
+        self.jobs.cancel(name)
+        self.jobs.submit(name, search, on_partial=self.window[table].append, on_done=search_done)
+
+    def search_more(self, table):
+        if rest := self._search_rest.pop(table, None):
+            self.window[table].append(rest)
+        self.window[f"{table}_mas"].update(visible=False)
+
     def add_created_invoice(self, invoice: MyCFDI):
+        if self._all_invoices is None:
+            # not loaded yet, a load already running may have listed the folder before the file was saved
+            self.invalidate_invoices()
+            return
         self._all_invoices[invoice.uuid] = invoice
+        if self._invoices_by_date and self._invoices_by_date[0] is self._all_invoices:
+            bisect.insort(self._invoices_by_date[1], invoice, key=invoice_date_key)
         complement_invoices(self._all_invoices, invoice)
 
-    def generate_invoice(self, invoice):
-        ref_id = random_string()
-        title = 'Generando factura'
-
-        # Add Serie and Folio and signature
-        folio = None
-        if 'Serie' not in invoice:
-            invoice['Serie'] = self.local_db.serie()
-            folio = self.local_db.folio()
-            invoice['Folio'] = str(folio)
-
-        cfdi40.Comprobante.sign(
-            invoice,
-            self.emisores[invoice['Emisor']['Rfc']]['csd']
+    def stamp_invoices(self, invoices, title):
+        pipeline = StampingPipeline(
+            local_db=self.local_db,
+            emisores=self.emisores,
+            pac_services=self.pac_services,
+            max_workers=self.stamp_workers,
         )
-
-        attempts = 3
+        if job := self.recover_stamps():
+            # the invoices left by an earlier batch are saved first
+            while self.jobs.get(RECOVER_STAMPS_JOB) is job:
+                if not self._read(timeout=100):
+                    return []
+        pipeline.submit(invoices)
+
+        results = []
         try:
-            for i in self.progress_iterate(
-                    title, range(attempts), lambda r: f'Intentando de nuevo... Intento {r + 1} de {attempts}', skip_first=True, delay=3000
-            ):
-                try:
-                    res = self.get_pac_service(invoice['Emisor']['Rfc']).stamp(
-                        cfdi=invoice,
-                        accept=Accept.XML,
-                        ref_id=ref_id
-                    )
-                except Exception as ex:
-                    self.show_console()
-                    message = f"Error al generar factura: {invoice.get('Serie')}{invoice.get('Folio')} {invoice['Receptor']['Rfc']}"
-                    message += f"\nIntento {i + 1} de {attempts}"
-
-                    logger.exception(message)
-                    print(message)
-                    if isinstance(ex, ResponseError):
-                        logger.error(f"Status Code: {ex.response.status_code}")
-                        print(f"Status Code: {ex.response.status_code}")
-                        logger.error(f"Response: {ex.response.text}")
-                        print(f"Response: {ex.response.text}")
-                    continue
-
-                if folio is not None:
-                    self.set_folio(folio + 1)
-                cfdi = MyCFDI.move_to_folder(res.xml, pdf_data=res.pdf)
-                self.add_created_invoice(cfdi)
-                return cfdi
+            for i in self.progress_iterate(title, range(len(invoices)), lambda r: f"{r + 1} de {len(invoices)}"):
+                # keep the window responsive while the PAC answers
+                while not pipeline.futures[i].done():
+                    if not self._read(timeout=100):
+                        return results
+                results.append(self.add_stamp_result(pipeline, pipeline.result(i)))
         finally:
-            self.progress_cancel(title)
+            pipeline.cancel()
+            for i in range(len(results), len(invoices)):
+                results.append(self.add_stamp_result(pipeline, pipeline.result(i)))
+
+            if unused := pipeline.release_folios(results):
+                self.show_console()
+                print(f"Folios sin usar: {', '.join(pipeline.serie + str(f) for f in unused)}")
+            self.set_inputs()
+
+        return results
+
+    def recover_stamps(self):
+        # the PAC is called from a job, the recovered invoices are saved when it is done
+        if job := self.jobs.get(RECOVER_STAMPS_JOB):
+            return job
+        if not self.local_db.stamp_journal():
+            return None
+
+        pipeline = StampingPipeline(
+            local_db=self.local_db,
+            emisores=self.emisores,
+            pac_services=self.pac_services,
+        )
+
+        def recover(job):
+            job.print("Recuperando facturas pendientes")
+            return pipeline.recover()
+
+        def recovered(results):
+            for result in results:
+                self.add_stamp_result(pipeline, result)
+
+        self.show_console()
+        return self.jobs.submit(RECOVER_STAMPS_JOB, recover, on_done=recovered)
+
+    def add_stamp_result(self, pipeline, result):
+        if result.document:
+            cfdi = MyCFDI.move_to_folder(result.document.xml, pdf_data=result.document.pdf)
+            pipeline.complete(result)
+            self.add_created_invoice(cfdi)
+        else:
+            self.show_console()
+            for error in result.errors:
+                print(error)
+        return result
 
     def set_serie(self, serie: str = None):
         if serie:
@@ -362,7 +496,27 @@ class FacturacionGUI:
 
         self.local_db.solicitud_merge(response["IdSolicitud"], rfc=rfc, request=args, response=response)
 
-    def recupera_comprobantes(self, sat_service, response, tipo_documento=None):
+    def recupera_solicitudes(self, job, solicitudes):
+        for solicitud in job.iterate(solicitudes):
+            rfc = solicitud["rfc"]
+            sat_service = SAT(signer=self.emisores[rfc]['fiel'])
+
+            id_solicitud = solicitud["response"]["IdSolicitud"]
+            tipo_documento = solicitud.get("request", {}).get("tipo_documento")
+
+            if tipo_documento == TipoDocumento.Retenciones:
+                response = sat_service.recover_retencion_status(
+                    id_solicitud=id_solicitud
+                )
+            else:
+                response = sat_service.recover_comprobante_status(
+                    id_solicitud=id_solicitud
+                )
+            job.print(to_yaml(response))
+            self.local_db.solicitud_merge(id_solicitud, rfc, response=response)
+            self.recupera_comprobantes(job, sat_service, response, tipo_documento=tipo_documento)
+
+    def recupera_comprobantes(self, job, sat_service, response, tipo_documento=None):
         if response["EstadoSolicitud"] == EstadoSolicitud.TERMINADA:
             for id_paquete in response['IdsPaquetes']:
                 if tipo_documento == TipoDocumento.Retenciones:
@@ -373,51 +527,63 @@ class FacturacionGUI:
                     r, paquete = sat_service.recover_comprobante_download(
                         id_paquete=id_paquete
                     )
-                print(f"paquete: {id_paquete}")
-                print_yaml(r)
+                job.print(f"paquete: {id_paquete}")
+                job.print(to_yaml(r))
                 if paquete:
                     data = base64.b64decode(paquete)
                     with open(PAQUETE_FILE, 'wb') as f:
                         f.write(data)
                     with io.BytesIO(data) as b:
-                        self.unzip_cfdi(b)
+                        self.unzip_cfdi(job, b)
 
-    def unzip_cfdi(self, file):
-        title = 'Descomprimiendo'
+    def unzip_cfdi(self, job, file):
         with ZipFile(file, "r") as zf:
-            try:
-                for fileinfo in self.progress_iterate(title, zf.infolist()):
-                    data = zf.read(fileinfo)
-                    match os.path.splitext(fileinfo.filename)[1]:
-                        case ".xml":
-                            self._all_invoices = None
-                            MyCFDI.move_to_folder(data, pdf_data=None)
-                        case ".pdf":
-                            pass
-                        case ".txt":
-                            cfdi_metadata_reader = csv.reader(
-                                (c.decode('utf-8') for c in data.splitlines() if c),
-                                delimiter='~',
-                                quotechar='|'
+            for fileinfo in job.iterate(zf.infolist(), lambda x: x.filename):
+                data = zf.read(fileinfo)
+                match os.path.splitext(fileinfo.filename)[1]:
+                    case ".xml":
+                        self.invalidate_invoices()
+                        MyCFDI.move_to_folder(data, pdf_data=None)
+                    case ".pdf":
+                        pass
+                    case ".txt":
+                        cfdi_metadata_reader = csv.reader(
+                            (c.decode('utf-8') for c in data.splitlines() if c),
+                            delimiter='~',
+                            quotechar='|'
+                        )
+                        header = next(cfdi_metadata_reader)
+                        if 'Estatus' not in header:
+                            continue
+                        for row in cfdi_metadata_reader:
+                            row = dict(zip(header, row))
+                            job.print(to_yaml(row))
+                            self.local_db.status_merge(
+                                uuid=row['Uuid'],
+                                estatus=row['Estatus'],
+                                fecha_cancelacion=row['FechaCancelacion']
                             )
-                            header = next(cfdi_metadata_reader)
-                            if 'Estatus' not in header:
-                                continue
-                            for row in cfdi_metadata_reader:
-                                row = dict(zip(header, row))
-                                print_yaml(row)
-                                self.local_db.status_merge(
-                                    uuid=row['Uuid'],
-                                    estatus=row['Estatus'],
-                                    fecha_cancelacion=row['FechaCancelacion']
-                                )
-            finally:
-                self.progress_cancel(title)
+
+    def importar_emitidas(self, job, csv_file, all_invoices):
+        with open(csv_file, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            rows = [dict(zip(header, row)) for row in reader]
+
+        for row in job.iterate(rows, lambda x: x["Folio Fiscal (UUID)"]):
+            uuid = UUID(row["Folio Fiscal (UUID)"])
+            if uuid not in all_invoices:
+                cfdi = self.download_invoice(uuid)
+
+                if row.get("Estatus", "Entregado SAT") != "Entregado SAT":
+                    cfdi.status_sat(update=True)
 
     def _read(self, timeout=0):
         event, values = self.window.read(timeout=timeout)
         if event in ("Exit", sg.WIN_CLOSED):
             return False
+        if event in BACKGROUND_EVENTS:
+            self.action(event, values)
         return True
 
     def progress_iterate(self, title, items, fn=None, skip_first=False, delay=0):
@@ -471,16 +637,15 @@ class FacturacionGUI:
                     yield file
 
             receptor_info = clientes[receptor]
-            with self.email_manager.sender as s:
-                s.send_email(
-                    subject=f"Prediales {receptor_info['RazonSocial']} - {receptor_info['Rfc']}",
-                    to_addrs=clientes.correos(receptor),
-                    html=facturacion_environment.get_template('mail_prediales_template.html').render(
-                        receptor=receptor_info,
-                        email_signature=self.email_signature
-                    ),
-                    file_attachments=attachments()
-                )
+            self.outbox.enqueue(
+                subject=f"Prediales {receptor_info['RazonSocial']} - {receptor_info['Rfc']}",
+                to_addrs=clientes.correos(receptor),
+                html=facturacion_environment.get_template('mail_prediales_template.html').render(
+                    receptor=receptor_info,
+                    email_signature=self.email_signature
+                ),
+                file_attachments=attachments()
+            )
 
     def action_button(self, action_name, action_items, action_text):
         try:
@@ -490,121 +655,133 @@ class FacturacionGUI:
                     folder = os.path.join(folder, "prediales")
                     os.makedirs(folder, exist_ok=True)
 
-                    for p in self.progress_iterate(action_text, action_items):
-                        predial = p['Concepto']['CuentaPredial']
-                        process_predial(folder, predial)
+                    prediales = [p['Concepto']['CuentaPredial'] for p in action_items]
+                    futures = process_prediales(folder, prediales)
+                    errors = []
+                    try:
+                        for predial, future in self.progress_iterate(action_text, list(zip(prediales, futures)), lambda x: x[0]):
+                            while not future.done():
+                                if not self._read(timeout=100):
+                                    return
+                            if ex := future.exception():
+                                errors.append(f"{predial}: {ex}")
+                    finally:
+                        for future in futures:
+                            future.cancel()
+
+                    if errors:
+                        self.show_console()
+                        for e in errors:
+                            print(e)
 
                 case 'solicitudes':
-                    for solicitud in self.progress_iterate(action_text, action_items):
-                        rfc = solicitud["rfc"]
-                        sat_service = SAT(signer=self.emisores[rfc]['fiel'])
-
-                        id_solicitud = solicitud["response"]["IdSolicitud"]
-                        tipo_documento = solicitud.get("request", {}).get("tipo_documento")
-
-                        if tipo_documento == TipoDocumento.Retenciones:
-                            response = sat_service.recover_retencion_status(
-                                id_solicitud=id_solicitud
-                            )
-                        else:
-                            response = sat_service.recover_comprobante_status(
-                                id_solicitud=id_solicitud
-                            )
-                        print_yaml(response)
-                        self.local_db.solicitud_merge(id_solicitud, rfc, response=response)
-                        self.recupera_comprobantes(sat_service, response, tipo_documento=tipo_documento)
+                    self.jobs.submit(
+                        action_text,
+                        self.recupera_solicitudes,
+                        action_items,
+                        on_done=lambda _: self.window['solicitudes_table'].update(
+                            values=list(self.local_db.get_solicitudes().values()),
+                        )
+                    )
 
                 case 'facturas' | 'pago':
-                    for invoice in self.progress_iterate(action_text, action_items):
-                        if not self.generate_invoice(invoice=invoice):
-                            break
+                    self.stamp_invoices(action_items, action_text)
 
                 case 'correos':
                     clientes = ClientsManager()
-                    with self.email_manager.sender as s:
-                        for receptor, facturas, facturas_facturas_pendientes_meses_anteriores in self.progress_iterate(action_text, action_items):
-                            tipos_facturas = set(i["TipoDeComprobante"] for i in facturas)
+                    for receptor, facturas, facturas_facturas_pendientes_meses_anteriores in self.progress_iterate(action_text, action_items):
+                        tipos_facturas = set(i["TipoDeComprobante"] for i in facturas)
 
-                            def attachments():
-                                for ni in facturas:
-                                    yield ni.xml_filename
-                                    yield ni.pdf_filename
+                        def attachments():
+                            for ni in facturas:
+                                yield ni.xml_filename
+                                yield ni.pdf_filename
 
-                            if "I" in tipos_facturas:
-                                titulo = "Comprobantes Fiscales"
-                            else:
-                                titulo = "Complementos de Pago"
-
-                            if len(facturas) == 1 and facturas[0]["TipoDeComprobante"] == "P":
-                                f = facturas[0]
-                                pago = f["Complemento"]["Pagos"]["Pago"][0]["DoctoRelacionado"][0]["IdDocumento"]
-                                doc = self.get_all_invoices().get(UUID(pago))
-
-                                descripcion = doc["Conceptos"][0]['Descripcion']
-                                match = re.search(r'\bMES DE\s+(\w+)', descripcion, re.IGNORECASE)
-                                desc = match.group(1)
-
-                                titulo =  "Complemento de Pago del mes " + desc
-
-                            s.send_email(
-                                subject=f"{titulo} {receptor['RazonSocial']} - {receptor['Rfc']}",
-                                to_addrs=clientes.correos(receptor['Rfc'], filters=tipos_facturas),
-                                html=facturacion_environment.get_template('mail_facturas_template.html').render(
-                                    facturas=facturas,
-                                    facturas_pendientes_meses_anteriores=facturas_facturas_pendientes_meses_anteriores,
-                                    receptor=receptor,
-                                    email_signature=self.email_signature
-                                ),
-                                file_attachments=attachments()
-                            )
-                            for r in facturas:
-                                r.notified_flip()
+                        if "I" in tipos_facturas:
+                            titulo = "Comprobantes Fiscales"
+                        else:
+                            titulo = "Complementos de Pago"
+
+                        if len(facturas) == 1 and facturas[0]["TipoDeComprobante"] == "P" \
+                                and len(facturas[0]["Complemento"]["Pagos"]["Pago"][0]["DoctoRelacionado"]) == 1:
+                            f = facturas[0]
+                            pago = f["Complemento"]["Pagos"]["Pago"][0]["DoctoRelacionado"][0]["IdDocumento"]
+                            doc = self.get_all_invoices().get(UUID(pago))
+
+                            descripcion = doc["Conceptos"][0]['Descripcion']
+                            match = re.search(r'\bMES DE\s+(\w+)', descripcion, re.IGNORECASE)
+                            desc = match.group(1)
+
+                            titulo =  "Complemento de Pago del mes " + desc
+
+                        self.outbox.enqueue(
+                            subject=f"{titulo} {receptor['RazonSocial']} - {receptor['Rfc']}",
+                            to_addrs=clientes.correos(receptor['Rfc'], filters=tipos_facturas),
+                            html=facturacion_environment.get_template('mail_facturas_template.html').render(
+                                facturas=facturas,
+                                facturas_pendientes_meses_anteriores=facturas_facturas_pendientes_meses_anteriores,
+                                receptor=receptor,
+                                email_signature=self.email_signature
+                            ),
+                            file_attachments=attachments(),
+                            notify=[r.uuid for r in facturas]
+                        )
 
                 case 'ajustes' | 'depositos':
-                    with self.email_manager.sender as s:
-                        grouped_action_items = []
-                        for _, g_data in itertools.groupby(
-                                sorted(
-                                    action_items,
-                                    key=lambda r: r["receptor"]["Rfc"]
+                    grouped_action_items = []
+                    for _, g_data in itertools.groupby(
+                            sorted(
+                                action_items,
+                                key=lambda r: r["receptor"]["Rfc"]
+                            ),
+                            lambda r: r["receptor"]["Rfc"]
+                    ):
+                        grouped_action_items.append(list(g_data))
+
+                    for g_data in self.progress_iterate(action_text, grouped_action_items):
+                        file_names = []
+                        for data in g_data:
+                            if file := data['create_fn']():
+                                file_names.append(file)
+
+                        if file_names:
+                            receptor = g_data[0]['receptor']
+                            if action_name == 'ajustes':
+                                subject = f"Ajuste Renta {receptor['RazonSocial']} - {receptor['Rfc']}"
+                            elif action_name == 'depositos':
+                                subject = f"Depósito Renta {receptor['RazonSocial']} - {receptor['Rfc']}"
+                            else:
+                                raise NotImplementedError()
+
+                            self.outbox.enqueue(
+                                subject=subject,
+                                to_addrs=receptor["Email"],
+                                html=facturacion_environment.get_template(f'mail_{action_name}_template.html').render(
+                                    email_signature=self.email_signature,
+                                    **data
                                 ),
-                                lambda r: r["receptor"]["Rfc"]
-                        ):
-                            grouped_action_items.append(list(g_data))
-
-                        for g_data in self.progress_iterate(action_text, grouped_action_items):
-                            file_names = []
-                            for data in g_data:
-                                if file := data['create_fn']():
-                                    file_names.append(file)
-
-                            if file_names:
-                                receptor = g_data[0]['receptor']
-                                if action_name == 'ajustes':
-                                    subject = f"Ajuste Renta {receptor['RazonSocial']} - {receptor['Rfc']}"
-                                elif action_name == 'depositos':
-                                    subject = f"Depósito Renta {receptor['RazonSocial']} - {receptor['Rfc']}"
-                                else:
-                                    raise NotImplementedError()
-
-                                s.send_email(
-                                    subject=subject,
-                                    to_addrs=receptor["Email"],
-                                    html=facturacion_environment.get_template(f'mail_{action_name}_template.html').render(
-                                        email_signature=self.email_signature,
-                                        **data
-                                    ),
-                                    file_attachments=file_names
-                                )
+                                file_attachments=file_names
+                            )
 
                 case 'clientes':
-                    for client in self.progress_iterate(
-                            action_text, action_items, lambda x: f"Validando: {x['Rfc']}"
-                    ):
-                        if errors := validar_client(client):
-                            self.show_console()
-                            for e in errors:
-                                print(e)
+                    futures = validar_clientes(action_items, local_db=self.local_db)
+                    errors = []
+                    try:
+                        for client, future in self.progress_iterate(
+                                action_text, list(zip(action_items, futures)), lambda x: f"Validando: {x[0]['Rfc']}"
+                        ):
+                            while not future.done():
+                                if not self._read(timeout=100):
+                                    return
+                            errors.extend(future.result())
+                    finally:
+                        for future in futures:
+                            future.cancel()
+
+                    if errors:
+                        self.show_console()
+                        for e in errors:
+                            print(e)
 
                 case _:
                     raise ValueError(f"Invalid action: {action_name}")
@@ -726,31 +903,45 @@ class FacturacionGUI:
                 )
 
         # PPD
-        is_ppd_active = \
-            is_active \
-            and i["TipoDeComprobante"] == TipoDeComprobante.INGRESO \
-            and i["MetodoPago"] == MetodoPago.PAGO_EN_PARCIALIDADES_O_DIFERIDO \
-            and i.saldo_pendiente() > 0
-
-        self.window["ppd_action_items"].update(visible=is_ppd_active)
-        self.window["importe_pago"].update(i.saldo_pendiente() if is_ppd_active else '')
-        if is_ppd_active:
-            self.action_button_manager.set_items("pago", [i])
+        def is_ppd_active(c):
+            return c.estatus() == EstadoComprobante.VIGENTE \
+                and c["TipoDeComprobante"] == TipoDeComprobante.INGRESO \
+                and c["MetodoPago"] == MetodoPago.PAGO_EN_PARCIALIDADES_O_DIFERIDO \
+                and c.saldo_pendiente() > 0
+
+        # several invoices are paid at once, grouped by receptor, the amount is only meaningful in one currency
+        ppd_active = bool(cfdis) and all(is_ppd_active(c) for c in cfdis) and len({c["Moneda"] for c in cfdis}) == 1
+
+        self.window["ppd_action_items"].update(visible=ppd_active)
+        self.window["importe_pago"].update(saldo_pendiente_pagos(cfdis) if ppd_active else '')
+        if ppd_active:
+            self.action_button_manager.set_items("pago", cfdis)
         else:
             self.action_button_manager.clear()
 
     def header(self, name, select_console=True):
         if select_console:
             self.show_console()
-        self.console.update(header_line(name))
+        self.console_writer.set(header_line(name))
         self._read()
 
+    def remove_notified(self, uuids):
+        # rows of notified invoices are dropped, they can't be selected and sent again
+        table = self.window['correos_table']
+        if not (uuids := set(uuids)) or not isinstance(table.metadata, list):
+            return
+        rows = [r for r in table.metadata if not any(i.uuid in uuids for i in r[1])]
+        if len(rows) < len(table.metadata):
+            table.update(values=rows)
+            if self.action_button_manager.name == "correos":
+                self.action_button_manager.clear()
+
     def show_console(self):
         self.window['errores_tab'].select()
 
     def download_invoice(self, uuid: UUID):
         res = self.pac_service.recover(uuid, accept=Accept.XML)
-        self._all_invoices = None
+        self.invalidate_invoices()
         return MyCFDI.move_to_folder(res.xml, pdf_data=res.pdf)
 
     def facturas_search(self):
@@ -760,20 +951,32 @@ class FacturacionGUI:
         if len(search_text) < 3:
             raise ValueError("Búsqueda debe de tener al menos 3 caracteres")
 
-        def fact_iter():
+        screened = {}
+        listado = []
+
+        def prepare(job):
+            # screening may download the listado, it is done before the search time budget starts
+            if search_text == SearchOptions.Listado69B:
+                emitidas = [i for i in self.iter_invoices(job) if i["Emisor"]["Rfc"] in self.emisores]
+                screened.update(listado_69b.screen(i["Receptor"]["Rfc"] for i in emitidas))
+                listado.extend(i for i in emitidas if i["Receptor"]["Rfc"] in screened)
+
+        def fact_iter(job):
             if search_text == SearchOptions.PorPagar:
-                for i in self.get_all_invoices().values():
+                for i in self.iter_invoices(job):
                     if i["Emisor"]["Rfc"] in self.emisores \
                             and i.liquidated_state() == LiquidatedState.PENDING:
                         yield i
             elif search_text == SearchOptions.PorEnviar:
-                for i in self.get_all_invoices().values():
+                for i in self.iter_invoices(job):
                     if i["Emisor"]["Rfc"] in self.emisores \
                             and not i.notified() \
                             and i.estatus() == EstadoComprobante.VIGENTE:
                         yield i
+            elif search_text == SearchOptions.Listado69B:
+                yield from listado
             elif date_search_text := to_date_period(search_text):
-                for i in self.get_all_invoices().values():
+                for i in self.iter_invoices(job):
                     if i["Emisor"]["Rfc"] in self.emisores \
                             and i["Fecha"] == date_search_text:
                         yield i
@@ -783,14 +986,14 @@ class FacturacionGUI:
                         self.download_invoice(uuid_search_text)
                     except ResponseError as e:
                         if e.response.status_code == 404:
-                            self.error_message(f"Factura no encontrada en el PAC")
+                            raise ValueError("Factura no encontrada en el PAC")
                         else:
                             raise e
                 if c := self.get_all_invoices().get(uuid_search_text):
                     yield c
             else:
                 up_search_text = search_text.upper()
-                for i in self.get_all_invoices().values():
+                for i in self.iter_invoices(job):
                     if i["Emisor"]["Rfc"] in self.emisores \
                             and (
                             i.name == up_search_text
@@ -799,9 +1002,16 @@ class FacturacionGUI:
                     ):
                         yield i
 
-        self.window['emitidas_table'].update(
-            values=sorted(fact_iter(), key=lambda x: (x["Fecha"], x.get('Serie'), x.get('Folio')), reverse=False),
-        )
+        def on_done():
+            if search_text == SearchOptions.Listado69B:
+                self.print_listado_69b(screened)
+
+        self.stream_search(EMITIDAS_SEARCH_JOB, 'emitidas_table', fact_iter, prepare=prepare, on_done=on_done)
+
+    def print_listado_69b(self, screened):
+        self.header("Listado 69-B", select_console=bool(screened))
+        for rfc, status in sorted(screened.items()):
+            print(f"{rfc}: {status.value}")
 
     def facturas_search_recibidas(self):
         search_text = self.window["recibidas_search"].get()
@@ -810,20 +1020,31 @@ class FacturacionGUI:
         if len(search_text) < 3:
             raise ValueError("Búsqueda debe de tener al menos 3 caracteres")
 
-        def fact_iter():
+        screened = {}
+        listado = []
+
+        def prepare(job):
+            if search_text == SearchOptions.Listado69B:
+                recibidas = [i for i in self.iter_invoices(job) if i["Receptor"]["Rfc"] in self.emisores]
+                screened.update(listado_69b.screen(i["Emisor"]["Rfc"] for i in recibidas))
+                listado.extend(i for i in recibidas if i["Emisor"]["Rfc"] in screened)
+
+        def fact_iter(job):
             if search_text == SearchOptions.PorPagar:
-                for i in self.get_all_invoices().values():
+                for i in self.iter_invoices(job):
                     if i["Receptor"]["Rfc"] in self.emisores \
                             and i.liquidated_state() == LiquidatedState.PENDING:
                         yield i
             elif search_text == SearchOptions.PorEnviar:
-                for i in self.get_all_invoices().values():
+                for i in self.iter_invoices(job):
                     if i["Receptor"]["Rfc"] in self.emisores \
                             and not self.local_db.notified2(i) \
                             and i.estatus() == EstadoComprobante.VIGENTE:
                         yield i
+            elif search_text == SearchOptions.Listado69B:
+                yield from listado
             elif date_search_text := to_date_period(search_text):
-                for i in self.get_all_invoices().values():
+                for i in self.iter_invoices(job):
                     if i["Receptor"]["Rfc"] in self.emisores \
                             and i["Fecha"] == date_search_text:
                         yield i
@@ -833,14 +1054,14 @@ class FacturacionGUI:
                         self.download_invoice(uuid_search_text)
                     except ResponseError as e:
                         if e.response.status_code == 404:
-                            self.error_message(f"Factura no encontrada en el PAC")
+                            raise ValueError("Factura no encontrada en el PAC")
                         else:
                             raise e
                 if c := self.get_all_invoices().get(uuid_search_text):
                     yield c
             else:
                 up_search_text = search_text.upper()
-                for i in self.get_all_invoices().values():
+                for i in self.iter_invoices(job):
                     if i["Receptor"]["Rfc"] in self.emisores \
                             and (
                             i.name == up_search_text
@@ -849,9 +1070,11 @@ class FacturacionGUI:
                     ):
                         yield i
 
-        self.window['recibidas_table'].update(
-            values=sorted(fact_iter(), key=lambda x: (x["Fecha"], x.get('Serie'), x.get('Folio')), reverse=False),
-        )
+        def on_done():
+            if search_text == SearchOptions.Listado69B:
+                self.print_listado_69b(screened)
+
+        self.stream_search(RECIBIDAS_SEARCH_JOB, 'recibidas_table', fact_iter, prepare=prepare, on_done=on_done)
 
     def crear_pago(self, values, facturas_pagar):
         clients = ClientsManager()
@@ -873,15 +1096,24 @@ class FacturacionGUI:
         importe_pago = parse_importe_pago(values["importe_pago"])
         self.window["importe_pago"].update(importe_pago)
 
-        cfdi = pago_factura(
-            receptor_cif=clients[facturas_pagar[0]["Receptor"]["Rfc"]],
-            factura_pagar=facturas_pagar[0],
-            fecha_pago=fecha_pago,
-            forma_pago=values["forma_pago"],
-            importe_pago=importe_pago,
-            serie_pago=self.local_db.serie_pago(),
-        )
-        return [cfdi]
+        if len(facturas_pagar) > 1:
+            # every invoice is paid its saldo pendiente, grouped by receptor in a single complement
+            saldo_pendiente = saldo_pendiente_pagos(facturas_pagar)
+            if importe_pago != saldo_pendiente:
+                raise ValueError(f"Importe de Pago '{importe_pago}' debe ser igual al saldo pendiente '{saldo_pendiente}'")
+            importe_pago = None
+
+        return [
+            pago_facturas(
+                receptor_cif=clients[group[0]["Receptor"]["Rfc"]],
+                facturas_pagar=group,
+                fecha_pago=fecha_pago,
+                forma_pago=values["forma_pago"],
+                importe_pago=importe_pago,
+                serie_pago=self.local_db.serie_pago(),
+            )
+            for group in group_pagos(facturas_pagar)
+        ]
 
     def error_message(self, ex):
         sg.Popup(
@@ -983,12 +1215,16 @@ class FacturacionGUI:
         self.load_config(force=True)
         self.set_inputs()
         if clear:
-            self._all_invoices = None
+            self.invalidate_invoices()
             for t in ('facturas_table', 'clientes_table', 'emitidas_table', 'recibidas_table', 'correos_table', 'ajustes_table', 'depositos_table', 'solicitudes_table'):
                 self.window[t].update(values=[])
+        self.recover_stamps()
+        self.load_invoices()
 
     def main_tab_group(self, values):
         self.action_button_manager.clear()
+        if sources := TAB_DATA_SOURCES.get(values['main_tab_group']):
+            data_sources.watch(values['main_tab_group'], sources)
 
         match values['main_tab_group']:
             case 'productos_tab':
@@ -1012,6 +1248,7 @@ class FacturacionGUI:
                 now = date.today()
                 dp_now = DatePeriod(now.year, now.month)
                 clients = ClientsManager()
+                queued = self.outbox.pending_notify()
 
                 def correos():
                     for receptor_rfc, notify_invoices in itertools.groupby(
@@ -1020,6 +1257,7 @@ class FacturacionGUI:
                                  if i["Emisor"]["Rfc"] in self.emisores
                                     and i.estatus() == EstadoComprobante.VIGENTE
                                     and not i.notified()
+                                    and i.uuid not in queued
                                  ),
                                 key=lambda r: r["Receptor"]["Rfc"]
                             ),
@@ -1083,8 +1321,12 @@ class FacturacionGUI:
                     if not self.has_focus:
                         self.has_focus = True
                         self.load_config()
-                        if values["main_tab_group"] in ("clientes_tab", "facturas_tab", "ajustes_tab", "correos_tab", "depositos_tab"):
+                        tab = values["main_tab_group"]
+                        if tab in TAB_ALWAYS_RELOAD:
                             self.main_tab_group(values)
+                        elif sources := TAB_DATA_SOURCES.get(tab):
+                            if data_sources.changed(tab, sources):
+                                self.main_tab_group(values)
 
                 case '_focus_out':
                     try:
@@ -1104,6 +1346,46 @@ class FacturacionGUI:
                 case "about":
                     self.initial_screen()
 
+                case "job_progress":
+                    job = values[event]["job"]
+                    if not job.cancelled and not sg.one_line_progress_meter(
+                            '',
+                            values[event]["current"],
+                            values[event]["total"],
+                            job.name,
+                            values[event]["text"],
+                            key=job.name,
+                            keep_on_top=True,
+                            no_titlebar=True,
+                            grab_anywhere=True,
+                    ):
+                        job.cancel()
+
+                case "job_partial":
+                    values[event]["job"].deliver(values[event]["value"])
+
+                case "emitidas_table_mas" | "recibidas_table_mas":
+                    self.search_more(event.removesuffix("_mas"))
+
+                case "job_print":
+                    print(values[event])
+
+                case "job_done":
+                    self.progress_cancel(values[event].name)
+                    self.jobs.collect()
+
+                case "outbox_delivered":
+                    print(f"Correo enviado: {values[event]['subject']}")
+                    self.remove_notified(values[event]['notify'])
+
+                case "outbox_failed":
+                    self.show_console()
+                    print(f"Correo no enviado, intento {values[event]['attempts']}: {values[event]['subject']}\n{values[event]['last_error']}")
+
+                case "outbox_rejected":
+                    self.show_console()
+                    print(f"Correo rechazado, no se reintentará: {values[event]['subject']}\n{values[event]['last_error']}")
+
                 case "nueva_solicitud":
                     self.nueva_solicitud(values)
                     self.main_tab_group(values)
@@ -1203,7 +1485,7 @@ class FacturacionGUI:
                         self.done_message(f"Estado: {res['Estado']}")
                         self.set_selected_satcfdis_recibidas([i])
                         # noinspection PyUnresolvedReferences
-                        self.window['recibidas_table'].refresh()
+                        self.window['recibidas_table'].update_items([i])
 
                 case "status_sat":
                     # noinspection PyUnresolvedReferences
@@ -1213,7 +1495,7 @@ class FacturacionGUI:
                         self.done_message(to_yaml(res))
                         self.set_selected_satcfdis([i])
                         # noinspection PyUnresolvedReferences
-                        self.window['emitidas_table'].refresh()
+                        self.window['emitidas_table'].update_items([i])
 
                 case "pendiente_pago":
                     # noinspection PyUnresolvedReferences
@@ -1221,7 +1503,7 @@ class FacturacionGUI:
                         i.liquidated_flip()
                         self.set_selected_satcfdis([i])
                         # noinspection PyUnresolvedReferences
-                        self.window['emitidas_table'].refresh()
+                        self.window['emitidas_table'].update_items([i])
 
                 case "pendiente_pago_recibidas":
                     # noinspection PyUnresolvedReferences
@@ -1229,7 +1511,7 @@ class FacturacionGUI:
                         i.liquidated_flip()
                         self.set_selected_satcfdis_recibidas([i])
                         # noinspection PyUnresolvedReferences
-                        self.window['recibidas_table'].refresh()
+                        self.window['recibidas_table'].update_items([i])
 
                 case "email_notificada":
                     # noinspection PyUnresolvedReferences
@@ -1237,7 +1519,7 @@ class FacturacionGUI:
                         i.notified_flip()
                         self.set_selected_satcfdis([i])
                         # noinspection PyUnresolvedReferences
-                        self.window['emitidas_table'].refresh()
+                        self.window['emitidas_table'].update_items([i])
 
                 case "crear_facturas" | "ver_preview":
                     if not self.local_db.serie():
@@ -1287,6 +1569,13 @@ class FacturacionGUI:
                     if res == "OK":
                         self.enviar_prediales(action_items)
 
+                case "clientes_pendientes":
+                    pendientes = clientes_pendientes(ClientsManager().values(), self.local_db)
+                    self.window['clientes_table'].update(
+                        values=pendientes,
+                    )
+                    self.action_button_manager.set_items("clientes", pendientes)
+
                 case "editar_clientes":
                     open_file(
                         os.path.abspath("clientes.yaml")
@@ -1347,24 +1636,18 @@ class FacturacionGUI:
                 case "cargar_zip":
                     zip_file = sg.popup_get_file('', multiple_files=False, no_window=True, file_types=(("ZIP Files", "*.zip"),))
                     if zip_file:
-                        self.unzip_cfdi(zip_file)
+                        self.jobs.submit("Descomprimiendo", self.unzip_cfdi, zip_file)
 
                 case 'importar_emitidas':
                     csv_file = sg.popup_get_file('', multiple_files=False, no_window=True, file_types=(("CSV Files", "*.csv"),))
                     if csv_file:
-                        all_invoices = self.get_all_invoices()
-                        with open(csv_file, newline='', encoding='utf-8') as f:
-                            reader = csv.reader(f)
-                            header = next(reader)
-                            for row in reader:
-                                row = dict(zip(header, row))
-                                uuid = UUID(row["Folio Fiscal (UUID)"])
-                                if uuid not in all_invoices:
-                                    cfdi = self.download_invoice(uuid)
-
-                                    if row.get("Estatus", "Entregado SAT") != "Entregado SAT":
-                                        cfdi.status_sat(update=True)
-                        self.done_message("FIN")
+                        self.jobs.submit(
+                            "Importando Emitidas",
+                            self.importar_emitidas,
+                            csv_file,
+                            set(self.get_all_invoices()),
+                            on_done=lambda _: self.done_message("FIN")
+                        )
 
                 case 'descargar_emitidas':
                     download_folder = sg.popup_get_folder('', no_window=True,)
@@ -1424,6 +1707,7 @@ class FacturacionGUI:
                     self.init_db.update_cwd(
                         values["projecto_dir_browse"]
                     )
+                    self.console_writer.open_log(os.path.join(LOGS_DIRECTORY, CONSOLE_LOG_FILE))
                     self.initialize(clear=True)
 
                 case _:
@@ -1434,8 +1718,8 @@ class FacturacionGUI:
         except ConsoleErrors as ex:
             self.header(str(ex))
             for error in ex.errors:
-                self.console.update(f"{error}\n", append=True)
+                print(error)
         except Exception as ex:
             self.header("Exception")
-            self.console.update(append=True, value=str(ex))
+            print(ex)
             logger.exception("Main Loop Exception")
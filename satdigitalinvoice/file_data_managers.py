@@ -1,5 +1,7 @@
 import collections.abc
+import copy
 import decimal
+import hashlib
 import json
 import logging
 import os
@@ -14,11 +16,17 @@ from satcfdi.models import Code, DatePeriod
 from satcfdi.pacs import sat
 from satcfdi.transform.helpers import Xint
 from yaml import MappingNode, SafeLoader
-from yaml.constructor import ConstructorError
+from yaml.constructor import ConstructorError, SafeConstructor
+from yaml.resolver import Resolver
+
+try:
+    from yaml.cyaml import CParser
+except ImportError:
+    CParser = None
 
 from . import SOURCE_DIRECTORY
 from .log_tools import NoAliasDumper
-from .utils import find_best_match, first_duplicate
+from .utils import find_best_match, first_duplicate, record_hash
 
 logger = logging.getLogger(__name__)
 sat_manager = sat.SAT()
@@ -58,6 +66,19 @@ for ch in '-+0123456789.':
     )
 
 
+if CParser:
+    # same constructors and resolvers as DuplicateKeySafeLoader, parsing is done by libyaml
+    class CDuplicateKeySafeLoader(CParser, DuplicateKeySafeLoader):
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+
+    FastDuplicateKeySafeLoader = CDuplicateKeySafeLoader
+else:
+    FastDuplicateKeySafeLoader = DuplicateKeySafeLoader
+
+
 def load_validator(schema_file):
     with open(os.path.join(SOURCE_DIRECTORY, 'schemas', schema_file), "r", encoding="utf-8") as fs:
         schema = yaml.load(fs, SafeLoader)
@@ -66,10 +87,95 @@ def load_validator(schema_file):
         return validator(schema)
 
 
+class ValidationCache:
+    """ Remembers the records that already passed validation, so only new or changed records are validated """
+
+    def __init__(self, validator):
+        self.validator = validator
+        self.schema_hash = record_hash(validator.schema)
+        self.valid = set()
+        self.hits = 0
+        self.misses = 0
+
+    def validate(self, record):
+        key = (self.schema_hash, record_hash(record))
+        if key in self.valid:
+            self.hits += 1
+            return
+
+        self.misses += 1
+        if error := jsonschema.exceptions.best_match(self.validator.iter_errors(record)):
+            raise error
+        self.valid.add(key)
+
+    def stats(self):
+        return {"Hits": self.hits, "Misses": self.misses}
+
+
 client_validator = load_validator("cliente.yaml")
 factura_validator = load_validator("factura.yaml")
 product_validator = load_validator("producto.yaml")
 
+client_validation = ValidationCache(client_validator)
+factura_validation = ValidationCache(factura_validator)
+product_validation = ValidationCache(product_validator)
+
+
+class DataSourceRegistry:
+    """
+    Tracks the data files by mtime and size.
+    Files are parsed only when they change, files that are touched but keep the same content are not parsed again.
+    Views register the files they depend on, so they are refreshed only when those files change.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.views = {}
+
+    @staticmethod
+    def signature(file_source):
+        try:
+            st = os.stat(file_source)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def signatures(self, file_sources):
+        return {os.path.abspath(f): self.signature(f) for f in file_sources}
+
+    def document(self, file_source):
+        # the returned document is shared, it must not be modified
+        path = os.path.abspath(file_source)
+        signature = self.signature(path)
+
+        cached = self.documents.get(path)
+        if cached and signature and cached[0] == signature:
+            return cached[2]
+
+        with open(path, "rb") as fs:
+            content = fs.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if cached and cached[1] == digest:
+            self.documents[path] = (signature, digest, cached[2])
+            return cached[2]
+
+        document = yaml.load(content.decode("utf-8"), FastDuplicateKeySafeLoader)
+        self.documents[path] = (signature, digest, document)
+        return document
+
+    def watch(self, view, file_sources):
+        self.views[view] = self.signatures(file_sources)
+
+    def changed(self, view, file_sources) -> bool:
+        signatures = self.signatures(file_sources)
+        if self.views.get(view) == signatures:
+            return False
+        self.views[view] = signatures
+        return True
+
+
+data_sources = DataSourceRegistry()
+
 
 class LocalData(dict):
     file_source = None
@@ -83,8 +189,7 @@ class LocalData(dict):
         super().__init__(self._raw())
 
     def _raw(self):
-        with open(self.file_source, "r", encoding="utf-8") as fs:
-            return yaml.load(fs, DuplicateKeySafeLoader)
+        return copy.deepcopy(data_sources.document(self.file_source))
 
     def save(self):
         with open(self.file_source, "w", encoding="utf-8") as fs:
@@ -104,8 +209,7 @@ class ClientsManager(LocalData):
     def __init__(self, file_source=None):
         super().__init__(file_source)
         for k, v in self.items():
-            if error := jsonschema.exceptions.best_match(client_validator.iter_errors(v)):
-                raise error
+            client_validation.validate(v)
             self[k]["Rfc"] = k
             self[k]["RegimenFiscal"] = self[k]["RegimenFiscal"]
 
@@ -147,8 +251,7 @@ class ProductosManager(LocalData):
         for k, v in self.items():
             # if k == 'Constants':
             #     continue
-            if error := jsonschema.exceptions.best_match(product_validator.iter_errors(v)):
-                raise error
+            product_validation.validate(v)
 
 
 # function to deep merge two dictionaries
@@ -163,26 +266,38 @@ def deep_complement(destination, source):
             destination.setdefault(key, value)
 
 
+class Case(dict):
+    """ Unresolved !case node, maps the date where each value becomes effective to the value """
+
+
+def case_constructor(loader, node):
+    cases = loader.construct_mapping(node, deep=True)
+    return Case(
+        (datetime.strptime(k, '%Y-%m').date() if isinstance(k, str) else k, v) for k, v in cases.items()
+    )
+
+
+def resolve_cases(data, dp: DatePeriod | date | None):
+    # returns a fresh copy of data, callers are free to modify it
+    if isinstance(data, Case):
+        if dp is None:
+            return {k: resolve_cases(v, dp) for k, v in data.items()}
+        return resolve_cases(find_best_match(data, dp)[1], dp)
+    if isinstance(data, dict):
+        return {k: resolve_cases(v, dp) for k, v in data.items()}
+    if isinstance(data, list):
+        return [resolve_cases(v, dp) for v in data]
+    return data
+
+
 class FacturasManager(LocalData):
     file_source = "facturas.yaml"
 
     def __init__(self, dp: DatePeriod | date | None, file_source=None):
         if file_source:
             self.file_source = file_source
+        self.dp = dp
 
-        def loading_function(loader, node):
-            cases = loader.construct_mapping(node, deep=True)
-            cases = {
-                datetime.strptime(k, '%Y-%m').date() if isinstance(k, str) else k: v for k, v in cases.items()
-            }
-            if dp is None:
-                return cases
-            return find_best_match(
-                cases,
-                dp
-            )[1]
-
-        DuplicateKeySafeLoader.add_constructor("!case", loading_function)
         super().__init__()
         # if dup := first_duplicate(json.dumps(x, sort_keys=True, default=str) for x in self["Facturas"]):
         #     raise Exception("Factura Duplicada: {}".format(dup))
@@ -202,8 +317,10 @@ class FacturasManager(LocalData):
                         raise Exception("Producto no encontrado: {}".format(c["_producto"]))
 
             if dp:
-                if error := jsonschema.exceptions.best_match(factura_validator.iter_errors(v)):
-                    raise error
+                factura_validation.validate(v)
+
+    def _raw(self):
+        return resolve_cases(data_sources.document(self.file_source), self.dp)
 
 
 def decimal_constructor(loader, node):
@@ -217,6 +334,7 @@ def decimal_constructor(loader, node):
 
 
 DuplicateKeySafeLoader.add_constructor("!decimal", decimal_constructor)
+DuplicateKeySafeLoader.add_constructor("!case", case_constructor)
 DuplicateKeySafeLoader.add_constructor("!read", lambda loader, node: open(loader.construct_scalar(node), 'rb').read())
 
 
@@ -93,7 +93,7 @@ def parse_periodo_mes_ajuste(periodo_mes_ajuste: str):
 
 
 def format_concepto_desc(concepto, periodo):
-    template = facturacion_environment.from_string(concepto["Descripcion"])
+    template = facturacion_environment.from_string_cached(concepto["Descripcion"])
     concepto["Descripcion"] = template.render(
         periodo=periodo
     )
@@ -209,7 +209,24 @@ def parse_importe_pago(importe_pago: str):
 
 
 def pago_factura(factura_pagar, fecha_pago: datetime, forma_pago: str, importe_pago: Decimal = None, serie_pago=None, receptor_cif=None):
-    c = factura_pagar
+    return pago_facturas(
+        facturas_pagar=[factura_pagar],
+        fecha_pago=fecha_pago,
+        forma_pago=forma_pago,
+        importe_pago=importe_pago,
+        serie_pago=serie_pago,
+        receptor_cif=receptor_cif,
+    )
+
+
+def pago_facturas(facturas_pagar, fecha_pago: datetime, forma_pago: str, importe_pago: Decimal = None, serie_pago=None, receptor_cif=None):
+    # un solo complemento de pago, sin importe_pago o con varias facturas se pagan por su saldo pendiente
+    c = facturas_pagar[0]
+
+    if len(facturas_pagar) > 1:
+        saldo_pendiente = sum(f.saldo_pendiente() for f in facturas_pagar)
+        if importe_pago is not None and importe_pago != saldo_pendiente:
+            raise ValueError(f"Importe de Pago '{importe_pago}' debe ser igual al saldo pendiente '{saldo_pendiente}'")
 
     receptor = cfdi40.Receptor(
         rfc=receptor_cif['Rfc'],
@@ -225,11 +242,12 @@ def pago_factura(factura_pagar, fecha_pago: datetime, forma_pago: str, importe_p
         folio=c.get('Folio') if serie_pago else None,
         comprobantes=[
             PagoComprobante(
-                comprobante=c,
-                num_parcialidad=c.ultima_num_parcialidad + 1,
-                imp_saldo_ant=c.saldo_pendiente(),
-                imp_pagado=importe_pago
+                comprobante=f,
+                num_parcialidad=f.ultima_num_parcialidad + 1,
+                imp_saldo_ant=f.saldo_pendiente(),
+                imp_pagado=f.saldo_pendiente() if importe_pago is None or len(facturas_pagar) > 1 else importe_pago
             )
+            for f in facturas_pagar
         ],
         fecha_pago=fecha_pago,
         forma_pago=forma_pago,
@@ -237,6 +255,21 @@ def pago_factura(factura_pagar, fecha_pago: datetime, forma_pago: str, importe_p
     return invoice.process()
 
 
+def saldo_pendiente_pagos(facturas_pagar) -> Decimal:
+    # el saldo de varias facturas solo se puede sumar si estan en la misma moneda
+    if len({f["Moneda"] for f in facturas_pagar}) > 1:
+        raise ValueError("Facturas en diferente moneda se deben pagar por separado")
+    return sum(f.saldo_pendiente() for f in facturas_pagar)
+
+
+def group_pagos(facturas_pagar) -> list[list]:
+    # facturas que se pueden pagar en un mismo complemento
+    groups = {}
+    for f in facturas_pagar:
+        groups.setdefault((f["Emisor"]["Rfc"], f["Receptor"]["Rfc"], f["Moneda"]), []).append(f)
+    return list(groups.values())
+
+
 def iter_conceptos(facturas):
     for f in facturas:
         rfc_emisor = f["Emisor"]
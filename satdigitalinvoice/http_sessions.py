@@ -0,0 +1,142 @@
+import logging
+import threading
+from http.cookiejar import DefaultCookiePolicy
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from satcfdi.sat_requests_utils import SSLAdapter
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = (10, 120)  # seconds to connect, seconds to read
+HTTP_POOL_SIZE = 10
+
+# hosts that need their own adapter, SAT services only accept some ciphers
+HOST_ADAPTERS = {
+    "https://siat.sat.gob.mx/": lambda: SSLAdapter(pool_maxsize=HTTP_POOL_SIZE),
+}
+
+
+class HTTPSessions:
+    """
+    Keep-alive connections shared by the package, pooled per host with a default timeout.
+    Keeps the count and latency of the requests to each host.
+    """
+
+    def __init__(self, timeout=HTTP_TIMEOUT, pool_size=HTTP_POOL_SIZE, host_adapters=None):
+        self.timeout = timeout
+        self.session = requests.Session()
+        # only the connections are shared, cookies set by a host must not leak to other requests
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.session.mount('https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+        self.session.mount('http://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+        for prefix, adapter in (HOST_ADAPTERS if host_adapters is None else host_adapters).items():
+            self.session.mount(prefix, adapter())
+
+        self.lock = threading.Lock()
+        self.hosts = {}
+
+    def mount(self, prefix, adapter):
+        self.session.mount(prefix, adapter)
+
+    def request(self, method, url, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        failed = True
+        try:
+            res = self.session.request(method, url, **kwargs)
+            failed = res.status_code >= 400
+            return res
+        finally:
+            self._record(urlparse(url).netloc, time.perf_counter() - start, failed)
+
+    def get(self, url, params=None, **kwargs) -> requests.Response:
+        return self.request('GET', url, params=params, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs) -> requests.Response:
+        return self.request('POST', url, data=data, json=json, **kwargs)
+
+    def _record(self, host, elapsed, failed):
+        with self.lock:
+            h = self.hosts.setdefault(host, {"Requests": 0, "Errors": 0, "Time": 0.0, "MaxTime": 0.0})
+            h["Requests"] += 1
+            h["Errors"] += failed
+            h["Time"] += elapsed
+            h["MaxTime"] = max(h["MaxTime"], elapsed)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                host: {
+                    "Requests": h["Requests"],
+                    "Errors": h["Errors"],
+                    "AvgMs": round(h["Time"] / h["Requests"] * 1000),
+                    "MaxMs": round(h["MaxTime"] * 1000),
+                } for host, h in sorted(self.hosts.items())
+            }
+
+
+http_sessions = HTTPSessions()
+
+
+class SharedSession:
+    # stands for a requests.Session opened by satcfdi, closing it keeps the shared connections
+    def __init__(self, sessions: HTTPSessions):
+        self.sessions = sessions
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, exc_tb):
+        pass
+
+    def mount(self, prefix, adapter):
+        pass  # the shared session has its own adapters
+
+    def close(self):
+        pass
+
+    def request(self, method, url, **kwargs):
+        return self.sessions.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.sessions.get(url, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.sessions.post(url, data=data, json=json, **kwargs)
+
+
+class RequestsProxy:
+    # stands for the requests module in satcfdi modules, requests go through the shared sessions
+    def __init__(self, sessions: HTTPSessions):
+        self.sessions = sessions
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+    def request(self, method, url, **kwargs):
+        return self.sessions.request(method, url, **kwargs)
+
+    def get(self, url, params=None, **kwargs):
+        return self.sessions.get(url, params=params, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.sessions.post(url, data=data, json=json, **kwargs)
+
+    def Session(self):
+        return SharedSession(self.sessions)
+
+
+def patch_module(module, sessions=http_sessions):
+    # satcfdi calls the requests module functions, a new connection is opened for every call
+    if getattr(module, 'requests', None) is requests:
+        module.requests = RequestsProxy(sessions)
+
+
+def patch_satcfdi(sessions=http_sessions):
+    from satcfdi import csf
+    from satcfdi.pacs import sat
+    for module in (csf, sat):
+        patch_module(module, sessions)
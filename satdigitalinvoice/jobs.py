@@ -0,0 +1,153 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = 4
+JOB_PROGRESS_INTERVAL = 0.1  # seconds between progress events of the same job
+
+# window events posted by the jobs
+JOB_PROGRESS = "job_progress"
+JOB_PRINT = "job_print"
+JOB_PARTIAL = "job_partial"
+JOB_DONE = "job_done"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """
+    Long-running action executed on a worker thread.
+
+    The worker must not touch the window, it reports progress and console output through
+    window events and checks for cancellation on every progress step.
+    """
+
+    def __init__(self, name, on_event, on_done=None, on_partial=None):
+        self.name = name
+        self.on_event = on_event
+        self.on_done = on_done
+        self.on_partial = on_partial
+        self.future = None
+        self._cancelled = threading.Event()
+        self._last_progress = 0
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        if self.future:
+            self.future.cancel()
+
+    def check(self):
+        if self.cancelled:
+            raise JobCancelled(self.name)
+
+    def progress(self, current, total, text=""):
+        self.check()
+        now = time.monotonic()
+        if now - self._last_progress >= JOB_PROGRESS_INTERVAL:
+            self._last_progress = now
+            self.on_event(JOB_PROGRESS, {"job": self, "current": current, "total": total, "text": text})
+
+    def iterate(self, items, fn=None):
+        ln = len(items)
+        for i, item in enumerate(items):
+            self.progress(i, ln, fn(item) if callable(fn) else "")
+            yield item
+        self.check()
+
+    def print(self, *args, sep=" "):
+        self.on_event(JOB_PRINT, sep.join(str(a) for a in args))
+
+    def partial(self, value):
+        # intermediate result, handed to on_partial on the GUI thread
+        self.on_event(JOB_PARTIAL, {"job": self, "value": value})
+
+    def deliver(self, value):
+        if self.on_partial and not self.cancelled:
+            self.on_partial(value)
+
+    def complete(self):
+        # runs on the GUI thread once the worker has finished
+        try:
+            result = self.future.result()
+        except (JobCancelled, CancelledError):
+            logger.info("Cancelado: %s", self.name)
+            return
+        if self.on_done and not self.cancelled:
+            self.on_done(result)
+
+
+class JobExecutor:
+    """
+    Runs independent jobs concurrently and posts their events to the window.
+
+    on_event is usually window.write_event_value, the GUI calls collect() on JOB_DONE to run the
+    on_done callbacks of the finished jobs on its own thread.
+    """
+
+    def __init__(self, on_event, max_workers=JOB_WORKERS):
+        self.on_event = on_event
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, name, fn, *args, on_done=None, on_partial=None, **kwargs) -> Job:
+        with self.lock:
+            # a cancelled job is replaced right away, it stops at its next check
+            if (running := self.jobs.get(name)) and not running.cancelled:
+                raise ValueError(f"'{name}' ya está en proceso")
+            job = Job(name, self.on_event, on_done, on_partial)
+            self.jobs[name] = job
+            job.future = self.executor.submit(fn, job, *args, **kwargs)
+        job.future.add_done_callback(lambda f: self.on_event(JOB_DONE, job))
+        return job
+
+    def get(self, name) -> Job | None:
+        with self.lock:
+            return self.jobs.get(name)
+
+    def running(self) -> list[str]:
+        with self.lock:
+            return list(self.jobs)
+
+    def cancel(self, name):
+        if job := self.get(name):
+            job.cancel()
+
+    def cancel_all(self):
+        with self.lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            job.cancel()
+
+    def collect(self) -> list[Job]:
+        with self.lock:
+            done = [j for j in self.jobs.values() if j.future.done()]
+            for job in done:
+                del self.jobs[job.name]
+
+        # the remaining jobs complete even if one of them raises, the first error is raised
+        error = None
+        for job in done:
+            try:
+                job.complete()
+            except Exception as ex:
+                if error:
+                    logger.exception("Error en %s", job.name)
+                else:
+                    error = ex
+        if error:
+            raise error
+        return done
+
+    def shutdown(self):
+        self.cancel_all()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -90,13 +90,18 @@ class TipoDocumento(StrEnum):
 class SearchOptions(StrEnum):
     PorPagar = 'Por Pagar'
     PorEnviar = 'Por Enviar'
+    Listado69B = 'Listado 69-B'
     Hoy = datetime.now().strftime(CALENDAR_FECHA_FMT)
     Mes = datetime.now().strftime(PERIODO_FMT)
     Anio = datetime.now().strftime("%Y")
 
 
+TABLE_RENDER_BATCH = 200  # rows formatted and inserted into the treeview at a time
+TABLE_RENDER_THRESHOLD = 0.9  # scroll position that triggers rendering the next batch
+
+
 class MyTable(sg.Table):
-    def __init__(self, key, headings, row_fn):
+    def __init__(self, key, headings, row_fn, render_batch=TABLE_RENDER_BATCH):
         super().__init__(
             values=[],
             key=key,
@@ -124,47 +129,128 @@ class MyTable(sg.Table):
             metadata=True
         )
         self.row_fn = row_fn
+        self.render_batch = render_batch
+        # only the first `rendered` items of metadata are formatted and inserted in the treeview,
+        # more are rendered as the user scrolls towards the end
+        self.rendered = 0
+        self.all_selected = False
+        self._render_pending = False
+        self._scroll_command = None
 
     def selected_items(self):
+        if self.all_selected:
+            return list(self.metadata)
         return [self.metadata[i] for i in self.SelectedRows]
 
     def select_all(self):
+        self.all_selected = True
         self.update(
-            select_rows=list(range(len(self.metadata)))
+            select_rows=list(range(self.rendered))
         )
 
     def delete_selected(self):
-
-        def iter_metadata():
-            s = 0
-            for i in self.SelectedRows + [len(self.metadata)]:
-                for j in range(s, i):
-                    yield self.metadata[j]
-                s = i + 1
+        if self.all_selected:
+            selected = set(range(len(self.metadata)))
+        else:
+            selected = set(self.SelectedRows)
 
         self.update(
-            values=list(iter_metadata())
+            values=[item for i, item in enumerate(self.metadata) if i not in selected]
         )
 
     def update(self, values=None, **kwargs):
         if values is not None:
+            rows = max(self.render_batch, max(kwargs.get('select_rows') or [-1]) + 1)
+            self.metadata = values
+            self.rendered = min(rows, len(values))
+            self.all_selected = False
             super().update(
-                values=[
-                    self.row_fn(i, item)
-                    for i, item in enumerate(values, start=1)
-                ],
+                values=self._format_rows(0, self.rendered),
                 **kwargs
             )
-            self.metadata = values
+            self._hook_scroll()
         else:
             super().update(**kwargs)
 
     def refresh(self):
-        self.update(
-            self.metadata,
-            select_rows=self.SelectedRows
+        rendered, all_selected, selected = self.rendered, self.all_selected, self.SelectedRows
+        self.update(self.metadata)
+        self._render_to(rendered)
+        self.all_selected = all_selected
+        super().update(select_rows=selected)
+
+    def update_rows(self, rows):
+        # re-runs row_fn only for the given indexes, rows not rendered yet are formatted when reached
+        if not self._widget_was_created():
+            return
+        for i in rows:
+            if i < self.rendered:
+                value = self.row_fn(i + 1, self.metadata[i])
+                self.TKTreeview.item(i + 1, values=value, text=value)
+                self.Values[i] = value
+
+    def update_items(self, items):
+        ids = {id(item) for item in items}
+        self.update_rows(
+            i for i in range(self.rendered) if id(self.metadata[i]) in ids
         )
 
+    def append(self, values):
+        self.metadata.extend(values)
+        if not self._widget_was_created():
+            return
+        # new rows are rendered right away only while the end of the table is in view
+        if self.rendered < self.render_batch or self.TKTreeview.yview()[1] >= TABLE_RENDER_THRESHOLD:
+            self._render_to(self.rendered + self.render_batch)
+
+    def _format_rows(self, start, stop):
+        return [
+            self.row_fn(i, item)
+            for i, item in enumerate(self.metadata[start:stop], start=start + 1)
+        ]
+
+    def _render_to(self, stop):
+        start, stop = self.rendered, min(stop, len(self.metadata))
+        if stop <= start or not self._widget_was_created():
+            return
+
+        tree = self.TKTreeview
+        rows = self._format_rows(start, stop)
+        for i, value in enumerate(rows, start=start):
+            self.tree_ids.append(
+                tree.insert('', 'end', text=value, iid=i + 1, values=value, tag=i)
+            )
+            if self.AlternatingRowColor is not None and not i % 2:
+                tree.tag_configure(i, background=self.AlternatingRowColor)
+        self.Values.extend(rows)
+        self.rendered = stop
+
+        if self.all_selected:
+            tree.selection_add(list(range(start + 1, stop + 1)))
+
+    def _hook_scroll(self):
+        if self._scroll_command is not None or not self._widget_was_created():
+            return
+        # chain the scrollbar callback to render the next batch when reaching the end
+        self._scroll_command = str(self.TKTreeview.cget('yscrollcommand'))
+        self.TKTreeview.configure(yscrollcommand=self._on_yscroll)
+
+    def _on_yscroll(self, first, last):
+        if self._scroll_command:
+            self.TKTreeview.tk.call(self._scroll_command, first, last)
+        if float(last) >= TABLE_RENDER_THRESHOLD and self.rendered < len(self.metadata) and not self._render_pending:
+            self._render_pending = True
+            self.TKTreeview.after_idle(self._render_next)
+
+    def _render_next(self):
+        self._render_pending = False
+        self._render_to(self.rendered + self.render_batch)
+
+    def _treeview_selected(self, event):
+        if len(self.TKTreeview.selection()) < self.rendered:
+            self.all_selected = False
+        super()._treeview_selected(event)
+
 
 def make_layout():
     # ----- Full layout -----
@@ -186,6 +272,7 @@ def make_layout():
                                         ],
                                     ),
                                     sg.Input(SearchOptions.PorPagar, size=(40, 1), key="emitidas_search"), # datetime.now().strftime(PERIODO_FMT)
+                                    sg.Button("", key="emitidas_table_mas", border_width=0, button_color=sg.theme_background_color(), visible=False),
                                     sg.Push(),
                                     sg.Button(image_data=IMPORT_CSV, key="importar_emitidas", border_width=0, button_color=BUTTON_COLOR),
                                     sg.Button(image_data=DOWNLOAD, key="descargar_emitidas", border_width=0, button_color=BUTTON_COLOR),
@@ -259,6 +346,7 @@ def make_layout():
                                         ],
                                     ),
                                     sg.Input(SearchOptions.PorPagar, size=(40, 1), key="recibidas_search"),
+                                    sg.Button("", key="recibidas_table_mas", border_width=0, button_color=sg.theme_background_color(), visible=False),
                                     sg.Push(),
                                     sg.Button(image_data=DOWNLOAD, key="descargar_recibidas", border_width=0,
                                               button_color=BUTTON_COLOR),
@@ -467,6 +555,7 @@ def make_layout():
                         [
                             [
                                 sg.Button(image_data=EDIT_ICON, key="editar_clientes", border_width=0, button_color=BUTTON_COLOR),
+                                sg.Button("Cambios", key="clientes_pendientes", border_width=0, tooltip="Clientes modificados, vencidos o con errores desde su ultima validacion"),
                                 sg.Push(),
                                 sg.Button("Exportar", key="exportar_clientes", border_width=0),
                             ],
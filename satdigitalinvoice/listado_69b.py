@@ -0,0 +1,102 @@
+import csv
+import logging
+import os
+import pickle
+import threading
+import time
+from itertools import islice
+
+from satcfdi import __version__
+from satcfdi.pacs import TaxpayerStatus
+
+from . import DATA_DIRECTORY
+from .http_sessions import http_sessions
+
+logger = logging.getLogger(__name__)
+
+LISTADO_69B_URL = "http://omawww.sat.gob.mx/cifras_sat/Documents/Listado_Completo_69-B.csv"
+LISTADO_69B_FILE = os.path.join(DATA_DIRECTORY, "listado_69b.pickle")
+LISTADO_69B_REFRESH = 15 * 86400  # seconds
+LISTADO_69B_RETRY = 3600  # seconds before downloading again after a failure
+
+
+def download_listado_69b() -> dict[str, str]:
+    r = http_sessions.get(
+        url=LISTADO_69B_URL,
+        headers={
+            "User-Agent": __version__.__user_agent__
+        },
+        timeout=120,
+    )
+    r.raise_for_status()
+
+    lines = str(r.content, 'windows-1250').splitlines(keepends=True)
+    csv_reader = csv.reader(islice(lines, 3, None), delimiter=',', quotechar='"')
+    return {row[1]: row[3] for row in csv_reader if len(row) > 3}
+
+
+class Listado69B:
+    """
+    Snapshot of the Listado Completo 69-B (EFOS/EDOS) kept on disk,
+    downloaded again once it is older than refresh_time.
+    """
+
+    def __init__(self, filename=LISTADO_69B_FILE, refresh_time=LISTADO_69B_REFRESH, download=download_listado_69b):
+        self.filename = filename
+        self.refresh_time = refresh_time
+        self.download = download
+        self.data = None
+        self.timestamp = None
+        self.retry_after = 0
+        self.lock = threading.Lock()
+
+    def _load_file(self):
+        try:
+            timestamp = os.path.getmtime(self.filename)
+        except FileNotFoundError:
+            return
+        if timestamp != self.timestamp:
+            with open(self.filename, 'rb') as f:
+                self.data = pickle.load(f)
+            self.timestamp = timestamp
+
+    def _save_file(self, data):
+        os.makedirs(os.path.dirname(self.filename) or '.', exist_ok=True)
+        temp = self.filename + '.tmp'
+        with open(temp, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, self.filename)
+
+    def listado(self) -> dict[str, str]:
+        with self.lock:
+            if self.data is None:
+                self._load_file()
+
+            now = time.time()
+            if (self.timestamp is None or now > self.timestamp + self.refresh_time) and now > self.retry_after:
+                try:
+                    data = self.download()
+                    self._save_file(data)
+                    self.data = data
+                    self.timestamp = os.path.getmtime(self.filename)
+                except Exception:
+                    logger.exception("Unable to get latest Listado 69B")
+                    self.retry_after = now + LISTADO_69B_RETRY
+
+            if self.data is None:
+                raise ValueError("Unable to load Listado Completo 69B")
+            return self.data
+
+    def status(self, rfc: str) -> TaxpayerStatus | None:
+        if r := self.listado().get(rfc):
+            return TaxpayerStatus(r)
+        return None
+
+    def screen(self, rfcs) -> dict[str, TaxpayerStatus]:
+        listado = self.listado()
+        return {
+            rfc: TaxpayerStatus(r) for rfc in set(rfcs) if (r := listado.get(rfc))
+        }
+
+
+listado_69b = Listado69B()
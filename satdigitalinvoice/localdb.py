@@ -1,6 +1,8 @@
 import logging
 import os
 import pickle
+import threading
+import time
 from datetime import datetime
 from uuid import UUID
 
@@ -15,6 +17,11 @@ STATUS_SAT = 3
 FOLIO = 5
 SERIE = 6
 SERIE_PAGO = 7
+FOLIOS_SIN_USAR = 8
+STAMP_JOURNAL = 9
+OUTBOX = 10
+CSF = 11
+CLIENT_VALIDATION = 12
 SOLICITUDES = 'solicitudes'
 EMAIL_TOKEN = 'email_token'
 
@@ -25,6 +32,8 @@ SCOPES = [
     'https://outlook.office.com/SMTP.Send',
     'offline_access'
 ]
+EMAIL_TOKEN_MARGIN = 300  # seconds before its expiration the access token is refreshed
+CSF_TTL = 7 * 24 * 60 * 60  # seconds a constancia de situacion fiscal is reused
 
 sat_manager = sat.SAT()
 
@@ -35,6 +44,7 @@ class LocalDB(diskcache.Cache):
     def __init__(self, base_path: str):
         super().__init__(directory=os.path.join(base_path, 'cache'))
         self.base_path = base_path
+        self.email_token_lock = threading.Lock()
 
     def folio(self) -> int:
         return self.get(FOLIO, 1)
@@ -42,6 +52,74 @@ class LocalDB(diskcache.Cache):
     def folio_set(self, value: int):
         self[FOLIO] = value
 
+    def folio_reserve(self, count: int) -> int:
+        # reserves the folios [folio, folio + count)
+        with self.transact():
+            folio = self.folio()
+            self.folio_set(folio + count)
+        return folio
+
+    def folio_release(self, start: int, end: int) -> bool:
+        # folios can be given back only if no other folio was reserved after them
+        with self.transact():
+            if self.folio() == end:
+                self.folio_set(start)
+                return True
+        return False
+
+    def folios_sin_usar(self) -> list:
+        return self.get(FOLIOS_SIN_USAR, [])
+
+    def folios_sin_usar_add(self, serie: str, folios):
+        with self.transact():
+            self[FOLIOS_SIN_USAR] = self.folios_sin_usar() + [serie + str(f) for f in folios]
+
+    def stamp_journal(self) -> dict:
+        return self.get(STAMP_JOURNAL, {})
+
+    def stamp_journal_set(self, ref_id: str, **values):
+        with self.transact():
+            journal = self.stamp_journal()
+            journal[ref_id] = journal.get(ref_id, {}) | values | {"updated": datetime.now().replace(microsecond=0)}
+            self[STAMP_JOURNAL] = journal
+
+    def stamp_journal_remove(self, ref_id: str):
+        with self.transact():
+            journal = self.stamp_journal()
+            if journal.pop(ref_id, None) is not None:
+                self[STAMP_JOURNAL] = journal
+
+    def outbox(self) -> dict:
+        return self.get(OUTBOX, {})
+
+    def outbox_set(self, message_id: str, **values):
+        with self.transact():
+            outbox = self.outbox()
+            outbox[message_id] = outbox.get(message_id, {}) | values
+            self[OUTBOX] = outbox
+
+    def outbox_remove(self, message_id: str):
+        with self.transact():
+            outbox = self.outbox()
+            if outbox.pop(message_id, None) is not None:
+                self[OUTBOX] = outbox
+
+    def csf(self, rfc: str, id_cif: str):
+        return self.get((CSF, rfc, id_cif))
+
+    def csf_set(self, rfc: str, id_cif: str, data: dict, expire=CSF_TTL):
+        self.set((CSF, rfc, id_cif), data, expire=expire)
+
+    def client_validation(self, rfc: str) -> dict | None:
+        return self.get((CLIENT_VALIDATION, rfc))
+
+    def client_validation_set(self, rfc: str, record_hash: str, errors: list):
+        self[(CLIENT_VALIDATION, rfc)] = {
+            "hash": record_hash,
+            "errors": errors,
+            "timestamp": datetime.now().replace(microsecond=0),
+        }
+
     def serie(self) -> str:
         return self.get(SERIE, '')
 
@@ -116,18 +194,25 @@ class LocalDB(diskcache.Cache):
         self.save_data(SOLICITUDES, solicitudes)
 
     def set_email_token(self, data):
+        if 'expires_in' in data:
+            data = data | {'expires_at': time.time() + int(data['expires_in'])}
         self[EMAIL_TOKEN] = data
 
-    def get_email_token(self):
-        data = self.get(EMAIL_TOKEN)
-        data = token_refresh(
-            refresh_token=data['refresh_token'],
-            issuer_uri=ISSUER_URI,
-            client_id=MozillaThunderbird_ID,
-            scopes=SCOPES
-        )
-        self.set_email_token(data)
-        return data
+    def get_email_token(self, force_refresh=False):
+        # the access token is refreshed only near its expiration or after it was rejected
+        with self.email_token_lock:
+            data = self.get(EMAIL_TOKEN)
+            if not force_refresh and data.get('expires_at', 0) - EMAIL_TOKEN_MARGIN > time.time():
+                return data
+
+            data = token_refresh(
+                refresh_token=data['refresh_token'],
+                issuer_uri=ISSUER_URI,
+                client_id=MozillaThunderbird_ID,
+                scopes=SCOPES
+            )
+            self.set_email_token(data)
+            return self.get(EMAIL_TOKEN)
 
     def get_email_token_manual(self):
         token = get_token_manual(
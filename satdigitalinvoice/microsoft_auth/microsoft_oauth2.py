@@ -7,9 +7,8 @@ from base64 import urlsafe_b64encode
 from random import randrange
 from urllib.parse import urlparse, parse_qs
 
-import requests
-
 from .auth_code_receiver import AuthCodeReceiver
+from ..http_sessions import http_sessions
 
 
 def get_token(
@@ -39,7 +38,7 @@ def get_token(
     else:
         server = AuthCodeReceiver(port=int(redirect_uri.split(":")[-1]))
 
-    res = requests.get(
+    res = http_sessions.get(
         url=posixpath.join(issuer_uri, "oauth2/v2.0/authorize"),
         params={
             "client_id": client_id,
@@ -99,7 +98,7 @@ def get_token_manual(
         "code_challenge": code_challenge
     })
 
-    res = requests.get(
+    res = http_sessions.get(
         url=posixpath.join(issuer_uri, "oauth2/v2.0/authorize"),
         params={
             "client_id": client_id,
@@ -151,7 +150,7 @@ def token_refresh(
     if scopes:
         data["scope"] = " ".join(scopes or [])
 
-    token = requests.post(
+    token = http_sessions.post(
         url=posixpath.join(issuer_uri, "oauth2/v2.0/token"),
         data=data,
         headers={
@@ -166,7 +165,7 @@ def token_refresh(
 
 
 def _exchange_code(issuer_uri, client_id, code_verifier, redirect_url, code):
-    token = requests.post(
+    token = http_sessions.post(
         url=posixpath.join(issuer_uri, "oauth2/v2.0/token"),
         data={
             "grant_type": "authorization_code",
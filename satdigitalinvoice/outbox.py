@@ -0,0 +1,162 @@
+import logging
+import threading
+import time
+from datetime import datetime
+
+from .email import is_permanent
+from .exceptions import ConsoleErrors
+from .utils import record_hash
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BACKOFF = 30  # seconds, doubled after every failed attempt
+OUTBOX_MAX_BACKOFF = 3600
+OUTBOX_POLL = 5
+OUTBOX_PERMANENT_ATTEMPTS = 3  # messages rejected with a 5xx reply are dropped after these attempts
+
+
+class Outbox:
+    """
+    Messages waiting to be sent, kept in LocalDB so they survive restarts.
+
+    A background thread delivers the due messages through the email sender, failed messages are
+    retried with exponential backoff and the invoices in notify are marked as notified once delivered.
+    Messages the server keeps rejecting permanently are dropped and reported with outbox_rejected.
+
+    stop() returns right away, the messages not sent yet are left in LocalDB for the next outbox,
+    which starts sending once the previous one has finished the messages in flight.
+    """
+
+    def __init__(self, local_db, sender, on_event=None, backoff=OUTBOX_BACKOFF, max_backoff=OUTBOX_MAX_BACKOFF, poll=OUTBOX_POLL,
+                 permanent_attempts=OUTBOX_PERMANENT_ATTEMPTS):
+        self.local_db = local_db
+        self.sender = sender
+        self.on_event = on_event
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll = poll
+        self.permanent_attempts = permanent_attempts
+
+        self.wake_up = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.futures = {}
+
+    def enqueue(self, subject: str, to_addrs: list, html: str = None, file_attachments=None, notify=()) -> str:
+        file_attachments = list(file_attachments or [])
+        notify = list(notify)
+        # the same message is queued only once while it is pending
+        message_id = record_hash([subject, to_addrs, html, file_attachments, notify])
+
+        if message_id not in self.local_db.outbox():
+            self.local_db.outbox_set(
+                message_id,
+                subject=subject,
+                to_addrs=list(to_addrs),
+                html=html,
+                file_attachments=file_attachments,
+                notify=notify,
+                attempts=0,
+                next_attempt=0,
+                created=datetime.now().replace(microsecond=0),
+            )
+        self.wake_up.set()
+        return message_id
+
+    def pending(self) -> int:
+        return len(self.local_db.outbox())
+
+    def pending_notify(self) -> set:
+        # invoices marked as notified once their message is delivered, they must not be sent again
+        return {uuid for m in self.local_db.outbox().values() for uuid in m['notify']}
+
+    def start(self, previous: 'Outbox' = None):
+        self.thread = threading.Thread(target=self._run, args=(previous,), name="outbox", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        # messages not sent yet are cancelled, only the ones in flight are finished
+        self.stopped.set()
+        self.wake_up.set()
+        for future in list(self.futures.values()):
+            future.cancel()
+
+    def join(self, timeout=None):
+        if self.thread:
+            self.thread.join(timeout)
+
+    def _run(self, previous=None):
+        if previous:
+            # the messages in flight of the previous outbox would be sent again
+            previous.join()
+        while not self.stopped.is_set():
+            try:
+                self.deliver()
+            except Exception:
+                logger.exception("Error al enviar correos pendientes")
+            self.wake_up.wait(self.poll)
+            self.wake_up.clear()
+
+    def deliver(self):
+        now = time.time()
+        due = {k: v for k, v in self.local_db.outbox().items() if v['next_attempt'] <= now}
+        if not due:
+            return
+
+        self.futures = futures = {}
+        try:
+            with self.sender as s:
+                for message_id, m in due.items():
+                    if self.stopped.is_set():
+                        break
+                    futures[message_id] = s.send_email(
+                        subject=m['subject'],
+                        to_addrs=m['to_addrs'],
+                        html=m['html'],
+                        file_attachments=m['file_attachments'],
+                    )
+        except ConsoleErrors:
+            pass  # failed messages are handled below
+        except Exception as ex:
+            # the messages were not queued, attachments missing, etc.
+            logger.exception("Error al enviar correos pendientes")
+            for message_id in due.keys() - futures.keys():
+                self._failed(message_id, due[message_id], ex)
+        finally:
+            self.futures = {}
+
+        for message_id, future in futures.items():
+            if future.cancelled():
+                continue  # stopped before it was sent, it is left for the next outbox
+            if not future.exception():
+                self._delivered(message_id, due[message_id])
+            else:
+                self._failed(message_id, due[message_id], future.exception())
+
+    def _delivered(self, message_id, message):
+        for uuid in message['notify']:
+            self.local_db.notified_set2(uuid, True)
+        self.local_db.outbox_remove(message_id)
+        logger.info("Correo enviado: %s", message['subject'])
+        self._event('outbox_delivered', message)
+
+    def _failed(self, message_id, message, error):
+        attempts = message['attempts'] + 1
+        if is_permanent(error) and attempts >= self.permanent_attempts:
+            self.local_db.outbox_remove(message_id)
+            logger.error("Correo rechazado: %s, intento %s: %s", message['subject'], attempts, error)
+            self._event('outbox_rejected', message | {'attempts': attempts, 'last_error': str(error)})
+            return
+
+        self.local_db.outbox_set(
+            message_id,
+            attempts=attempts,
+            next_attempt=time.time() + min(self.backoff * 2 ** (attempts - 1), self.max_backoff),
+            last_error=str(error),
+        )
+        logger.warning("Correo no enviado: %s, intento %s: %s", message['subject'], attempts, error)
+        self._event('outbox_failed', message | {'attempts': attempts, 'last_error': str(error)})
+
+    def _event(self, event, message):
+        if self.on_event:
+            self.on_event(event, message)
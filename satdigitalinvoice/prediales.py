@@ -1,13 +1,23 @@
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor, Future
 from itertools import batched
 
-import requests
 import yaml
 from bs4 import BeautifulSoup
 from satcfdi.exceptions import ResponseError
 
+from satdigitalinvoice.http_sessions import http_sessions
 from satdigitalinvoice.log_tools import NoAliasDumper
 
+logger = logging.getLogger(__name__)
+
+PREDIAL_WORKERS = 4
+PREDIAL_TIMEOUT = 60  # seconds
+
+# connections to the Torreón servers are reused across cuentas
+session = http_sessions
+
 
 def format_clavecat(clavecat: str):
     if "-" in clavecat:
@@ -20,11 +30,12 @@ def format_clavecat(clavecat: str):
 def request_predial(predial: str):
     predial = format_clavecat(predial)
 
-    r = requests.post(
+    r = session.post(
         url="https://pagoenlinea-api.torreon.gob.mx/api/predial/consultar",
         data={
             "cveCatastral": predial
-        }
+        },
+        timeout=PREDIAL_TIMEOUT
     )
     if r.status_code == 200:
         return r.json()
@@ -32,18 +43,50 @@ def request_predial(predial: str):
     raise ResponseError(r)
 
 
-def process_predial(folder, predial: str):
+def previous_adeudo(yaml_file):
+    try:
+        with open(yaml_file, "r", encoding="utf-8") as fs:
+            return yaml.safe_load(fs)['datosEdoCta']['K_ADEUDO']
+    except (FileNotFoundError, KeyError, TypeError, yaml.YAMLError):
+        return None
+
+
+def process_predial(folder, predial: str) -> bool:
+    # returns whether the estado de cuenta was downloaded
     res = request_predial(predial)
 
     yaml_file = os.path.join(folder, f"{predial}.yaml")
-    with open(yaml_file, "w", encoding="utf-8") as fs:
-        yaml.dump(res, fs, Dumper=NoAliasDumper, allow_unicode=True, width=1280, sort_keys=False)
+    pdf_file = os.path.join(folder, f"{predial}.pdf")
+    adeudo = previous_adeudo(yaml_file)
+
+    def save_yaml():
+        # written after the pdf, the adeudo in the yaml always matches the pdf on disk
+        with open(yaml_file, "w", encoding="utf-8") as fs:
+            yaml.dump(res, fs, Dumper=NoAliasDumper, allow_unicode=True, width=1280, sort_keys=False)
 
     edo_cta = res['datosEdoCta']
+    if adeudo is not None and adeudo == edo_cta['K_ADEUDO'] and os.path.exists(pdf_file):
+        logger.info("Predial sin cambios: %s", predial)
+        save_yaml()
+        return False
+
     url_adeudo = f"https://app.torreon.gob.mx/httpmethods/predial_estado_cuenta?adeudo_id={edo_cta['K_ADEUDO']}"
-    r = requests.get(
-        url=url_adeudo
+    r = session.get(
+        url=url_adeudo,
+        timeout=PREDIAL_TIMEOUT
     )
-    pdf_file = os.path.join(folder, f"{predial}.pdf")
+    if r.status_code != 200:
+        raise ResponseError(r)
+
     with open(pdf_file, "wb") as f:
         f.write(r.content)
+    save_yaml()
+    return True
+
+
+def process_prediales(folder, prediales, max_workers=PREDIAL_WORKERS) -> list[Future]:
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="predial")
+    try:
+        return [executor.submit(process_predial, folder, predial) for predial in prediales]
+    finally:
+        executor.shutdown(wait=False)
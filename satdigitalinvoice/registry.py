@@ -0,0 +1,52 @@
+import logging
+import threading
+
+from .utils import load_certificate, load_pac, record_hash
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigObjectCache:
+    """ Objects built from a config section, rebuilt only when their section changes """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.objects = {}
+        self.lock = threading.Lock()
+
+    def get(self, name, config):
+        key = record_hash(config)
+        with self.lock:
+            cached = self.objects.get(name)
+            if cached and cached[0] == key:
+                return cached[1]
+
+            logger.info("Loading %s", name)
+            obj = self.factory(config)
+            self.objects[name] = (key, obj)
+            return obj
+
+
+signers = ConfigObjectCache(load_certificate)
+pac_services = ConfigObjectCache(load_pac)
+
+
+def load_pac_services(config) -> dict:
+    # Per-RFC pac configuration
+    return {
+        rfc: pac_services.get(rfc, pac_config) for rfc, pac_config in config['pac'].items()
+    }
+
+
+def load_emisores(config) -> dict | None:
+    def load_emisor(rfc, data):
+        return {
+            "csd": signers.get((rfc, 'csd'), data['csd']),
+            "fiel": signers.get((rfc, 'fiel'), data['fiel']) if 'fiel' in data else None,
+        }
+
+    if emisores := config.get('emisores'):
+        return {
+            rfc: load_emisor(rfc, data) for rfc, data in emisores.items()
+        }
+    return None
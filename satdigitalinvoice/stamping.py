@@ -0,0 +1,250 @@
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass, field
+
+from satcfdi.cfdi import CFDI
+from satcfdi.create.cfd import cfdi40
+from satcfdi.exceptions import ResponseError
+from satcfdi.pacs import Accept, Document
+
+from .utils import random_string
+
+logger = logging.getLogger(__name__)
+
+STAMP_WORKERS = 4
+STAMP_ATTEMPTS = 3
+STAMP_RETRY_DELAY = 3  # seconds
+
+# stamp journal states, entries are removed once the invoice is saved
+SIGNED = 'signed'
+STAMPED = 'stamped'
+
+
+def is_rejected(ex) -> bool:
+    # the PAC answered and refused the request, the invoice was not stamped
+    return isinstance(ex, ResponseError) and 400 <= ex.response.status_code < 500
+
+
+def sign_fields(invoice, signer) -> dict:
+    # returns the fields added to the invoice by the signature
+    cfdi40.Comprobante.sign(invoice, signer)
+    return {k: invoice[k] for k in ('NoCertificado', 'Certificado', 'Sello')}
+
+
+@dataclass
+class StampResult:
+    invoice: dict
+    folio: int | None = None
+    document: Document | None = None
+    errors: list[str] = field(default_factory=list)
+    ref_id: str | None = None
+    unresolved: bool = False  # the PAC may have stamped it, the folio stays reserved until recovered
+
+
+class StampingPipeline:
+    """
+    Stamps a batch of invoices through a bounded pool of concurrent PAC requests.
+
+    Folios are reserved as one contiguous block before signing, invoices are signed ahead of the
+    PAC requests and results are returned in the same order as the invoices.
+
+    Every request is written to the stamp journal before it is sent, so invoices left in flight
+    by a crash are recovered with the same payload and ref_id instead of being stamped again.
+    """
+
+    def __init__(self, local_db, emisores, pac_services, max_workers=STAMP_WORKERS, attempts=STAMP_ATTEMPTS, retry_delay=STAMP_RETRY_DELAY):
+        self.local_db = local_db
+        self.emisores = emisores
+        self.pac_services = pac_services
+        self.max_workers = max_workers
+        self.attempts = attempts
+        self.retry_delay = retry_delay
+
+        self.invoices = []
+        self.folios = []
+        self.futures = []  # type: list[Future]
+        self.serie = None
+        self.reserved = None
+
+    def reserve_folios(self, invoices) -> list[int | None]:
+        pending = [i for i in invoices if 'Serie' not in i]
+        if not pending:
+            return [None] * len(invoices)
+
+        self.serie = self.local_db.serie()
+        start = self.local_db.folio_reserve(len(pending))
+        self.reserved = (start, start + len(pending))
+
+        folios = {}
+        for folio, invoice in enumerate(pending, start=start):
+            invoice['Serie'] = self.serie
+            invoice['Folio'] = str(folio)
+            folios[id(invoice)] = folio
+        return [folios.get(id(i)) for i in invoices]
+
+    def submit(self, invoices) -> list[Future]:
+        self.invoices = list(invoices)
+        self.folios = self.reserve_folios(self.invoices)
+
+        # signing takes about a millisecond, a single thread keeps ahead of the PAC requests,
+        # the xslt of the cadena original is shared and can't be used from several threads
+        signing = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sign")
+        stamping = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stamp")
+        try:
+            signed = [signing.submit(self._sign, invoice) for invoice in self.invoices]
+            self.futures = [
+                stamping.submit(self._stamp, invoice, folio, sign)
+                for invoice, folio, sign in zip(self.invoices, self.folios, signed)
+            ]
+        finally:
+            signing.shutdown(wait=False)
+            stamping.shutdown(wait=False)
+        return self.futures
+
+    def _sign(self, invoice) -> dict:
+        return sign_fields(invoice, self.emisores[invoice['Emisor']['Rfc']]['csd'])
+
+    def _stamp(self, invoice, folio, signed: Future) -> StampResult:
+        result = StampResult(invoice=invoice, folio=folio)
+        name = f"{invoice.get('Serie')}{invoice.get('Folio')} {invoice['Receptor']['Rfc']}"
+
+        try:
+            invoice.update(signed.result())
+        except Exception as ex:
+            logger.exception("Error al firmar factura: %s", name)
+            result.errors.append(f"Error al firmar factura: {name}\n{ex}")
+            return result
+
+        result.ref_id = ref_id = random_string()
+        payload = invoice.xml_bytes()
+        self.local_db.stamp_journal_set(
+            ref_id,
+            state=SIGNED,
+            rfc=invoice['Emisor']['Rfc'],
+            folio=folio,
+            payload=payload,
+            payload_hash=hashlib.sha256(payload).hexdigest(),
+        )
+
+        pac_service = self.pac_services[invoice['Emisor']['Rfc']]
+        ambiguous = False
+        for attempt in range(1, self.attempts + 1):
+            if attempt > 1:
+                time.sleep(self.retry_delay)
+            try:
+                result.document = pac_service.stamp(
+                    cfdi=invoice,
+                    accept=Accept.XML,
+                    ref_id=ref_id
+                )
+                self._stamped(ref_id, result.document)
+                return result
+            except Exception as ex:
+                message = f"Error al generar factura: {name}\nIntento {attempt} de {self.attempts}"
+                logger.exception(message)
+                if isinstance(ex, ResponseError):
+                    message += f"\nStatus Code: {ex.response.status_code}\nResponse: {ex.response.text}"
+                result.errors.append(message)
+
+                if is_rejected(ex):
+                    if not ambiguous:
+                        # the folio can be released, the request can't be sent again
+                        self.local_db.stamp_journal_remove(ref_id)
+                        return result
+                    break
+                ambiguous = True
+
+        # timeouts, connection errors, etc. the request is kept for recover()
+        result.unresolved = True
+        result.errors.append(f"Factura pendiente de recuperar: {name}")
+        return result
+
+    def _stamped(self, ref_id, document: Document):
+        # the stamped xml is kept until the invoice is saved, recovering it doesn't need the PAC
+        self.local_db.stamp_journal_set(ref_id, state=STAMPED, document_id=document.document_id, xml=document.xml, pdf=document.pdf)
+
+    def recover(self) -> list[StampResult]:
+        """
+        Finishes the requests left in the stamp journal, stamped invoices are taken from the journal,
+        or downloaded again from the PAC when the journal has no xml, and signed invoices are sent
+        again with the same payload and ref_id.
+        """
+        return [self._recover(ref_id, entry) for ref_id, entry in self.local_db.stamp_journal().items()]
+
+    def _recover(self, ref_id, entry) -> StampResult:
+        invoice = CFDI.from_string(entry['payload'])
+        result = StampResult(invoice=invoice, folio=entry['folio'], ref_id=ref_id)
+        name = f"{invoice.get('Serie')}{invoice.get('Folio')} {invoice['Receptor']['Rfc']}"
+
+        if hashlib.sha256(entry['payload']).hexdigest() != entry['payload_hash']:
+            result.errors.append(f"Error al recuperar factura: {name}\nEl contenido no corresponde")
+            return result
+
+        try:
+            pac_service = self.pac_services[entry['rfc']]
+            if entry['state'] == STAMPED and entry.get('xml'):
+                result.document = Document(document_id=entry['document_id'], xml=entry['xml'], pdf=entry.get('pdf'))
+            elif entry['state'] == STAMPED:
+                result.document = pac_service.recover(document_id=entry['document_id'], accept=Accept.XML)
+            else:
+                result.document = pac_service.stamp(cfdi=invoice, accept=Accept.XML, ref_id=ref_id)
+                self._stamped(ref_id, result.document)
+        except Exception as ex:
+            message = f"Error al recuperar factura: {name}"
+            logger.exception(message)
+            if isinstance(ex, ResponseError):
+                message += f"\nStatus Code: {ex.response.status_code}\nResponse: {ex.response.text}"
+            result.errors.append(message)
+
+            if entry['state'] == SIGNED and is_rejected(ex):
+                # never stamped, the folio is recorded as unused
+                self.local_db.stamp_journal_remove(ref_id)
+                if entry['folio'] is not None:
+                    self.local_db.folios_sin_usar_add(invoice['Serie'], [entry['folio']])
+        return result
+
+    def complete(self, result: StampResult):
+        # the invoice was saved, it no longer needs to be recovered
+        if result.ref_id:
+            self.local_db.stamp_journal_remove(result.ref_id)
+
+    def result(self, index) -> StampResult:
+        # waits for the invoice to finish
+        future = self.futures[index]
+        if future.cancelled():
+            return StampResult(
+                invoice=self.invoices[index],
+                folio=self.folios[index],
+                errors=[f"Cancelada: {self.invoices[index]['Receptor']['Rfc']}"]
+            )
+        return future.result()
+
+    def cancel(self):
+        # invoices already sent to the PAC can't be cancelled
+        for future in self.futures:
+            future.cancel()
+
+    def release_folios(self, results: list[StampResult]) -> list[int]:
+        """
+        Gives back the folios of the failed invoices at the end of the reserved block,
+        failed folios in the middle of the block are recorded as unused.
+        Returns the unused folios.
+        """
+        if not self.reserved:
+            return []
+
+        start, end = self.reserved
+        unused = sorted(r.folio for r in results if r.folio is not None and not r.document and not r.unresolved)
+
+        first_unused = end
+        while unused and unused[-1] == first_unused - 1:
+            first_unused = unused.pop()
+
+        if first_unused < end and not self.local_db.folio_release(first_unused, end):
+            unused.extend(range(first_unused, end))
+
+        if unused:
+            self.local_db.folios_sin_usar_add(self.serie, unused)
+        return unused
@@ -1,3 +1,5 @@
+import hashlib
+import json
 import os
 import random
 import shutil
@@ -9,6 +11,8 @@ from uuid import UUID
 from satcfdi.models import Signer, DatePeriod, Code
 from satcfdi.accounting.models import EstadoComprobante
 
+from .http_sessions import patch_module
+
 
 def to_date_period(periodo):
     if not periodo:
@@ -102,6 +106,19 @@ def load_certificate(data):
         )
 
 
+def load_pac(pac_config):
+    pac_module, pac_class = pac_config['type'].split(".")
+    mod = __import__(f"satcfdi.pacs.{pac_module}", fromlist=[pac_class])
+    patch_module(mod)
+    return getattr(mod, pac_class)(**pac_config['args'])
+
+
+def record_hash(data) -> str:
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True, default=lambda o: [type(o).__name__, str(o)]).encode()
+    ).hexdigest()
+
+
 def first_duplicate(seq):
     seen = set()
     for x in seq:
@@ -81,6 +81,7 @@ setuptools.setup(
         'test': [
             'coverage',
             'pytest',
+            'aiosmtpd',
         ]
     }
 )
@@ -1,4 +1,60 @@
+from datetime import timedelta
 
+from satcfdi.models import Code
 
-def test_something():
-    pass
\ No newline at end of file
+from satdigitalinvoice import client_validation
+from satdigitalinvoice.client_validation import validar_clientes, validar_client, clientes_pendientes
+from satdigitalinvoice.file_data_managers import ClientsManager
+from satdigitalinvoice.localdb import LocalDB
+from satdigitalinvoice.utils import record_hash
+
+
+def test_validar_clientes(tmp_path, monkeypatch):
+    retrieved = []
+
+    def retrieve(rfc, id_cif):
+        retrieved.append(rfc)
+        return {
+            "Denominación o Razón Social": "SERVICIOS COMERCIALES ANDREA",
+            "CP": "64264",
+            "Regimenes": [{"RegimenFiscal": Code("601", "General de Ley Personas Morales")}],
+            "Situación del contribuyente": "ACTIVO",
+        }
+
+    monkeypatch.setattr(client_validation.csf, "retrieve", retrieve)
+    monkeypatch.setattr(client_validation.listado_69b, "status", lambda rfc: None)
+
+    local_db = LocalDB(base_path=str(tmp_path))
+    clients = ClientsManager()
+    action_items = [clients["ABV9901115S7"], clients["ABC1511034U3"]]
+
+    errors = [f.result() for f in validar_clientes(action_items, local_db=local_db)]
+    assert errors[0] == []
+    assert errors[1][0].startswith("ABC1511034U3: RazonSocial")
+    assert sorted(retrieved) == ["ABC1511034U3", "ABV9901115S7"]
+
+    # the constancias are reused
+    assert [f.result() for f in validar_clientes(action_items, local_db=local_db)] == errors
+    assert len(retrieved) == 2
+
+
+def test_clientes_pendientes(tmp_path, monkeypatch):
+    monkeypatch.setattr(client_validation.csf, "retrieve", lambda rfc, id_cif: {})
+    local_db = LocalDB(base_path=str(tmp_path))
+    clients = [dict(c) for c in ClientsManager().values()]
+
+    assert clientes_pendientes(clients, local_db) == clients
+
+    for c in clients:
+        local_db.client_validation_set(c['Rfc'], record_hash(c), [])
+    assert clientes_pendientes(clients, local_db) == []
+
+    # edited, with errors and expired
+    clients[0]['CodigoPostal'] = '00000'
+    local_db.client_validation_set(clients[1]['Rfc'], record_hash(clients[1]), ["error"])
+    assert clientes_pendientes(clients, local_db) == clients[:2]
+    assert clientes_pendientes(clients, local_db, ttl=timedelta(0)) == clients
+
+    # validating records the result
+    assert validar_client(clients[0], local_db=local_db)
+    assert local_db.client_validation(clients[0]['Rfc'])['hash'] == record_hash(clients[0])
@@ -1,7 +1,14 @@
 from satdigitalinvoice.formatting_functions.common import pesos
+from satdigitalinvoice.environments import facturacion_environment
 from decimal import Decimal
 
 
 def test_pesos():
     assert pesos(1000.0) == '$1,000.00 (SON: MIL PESOS 00/100M.N.)'
     assert pesos(Decimal("123.123")) == '$123.12 (SON: CIENTO VEINTITRÉS PESOS 12/100M.N.)'
+
+
+def test_from_string_cached():
+    template = facturacion_environment.from_string_cached('SOME {{ periodo }}')
+    assert template is facturacion_environment.from_string_cached('SOME {{ periodo }}')
+    assert template.render(periodo='MES DE ENERO') == 'SOME MES DE ENERO'
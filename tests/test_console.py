@@ -0,0 +1,91 @@
+import os
+import sys
+
+from satdigitalinvoice.console import ConsoleWriter
+
+
+class FakeWidget:
+    def __init__(self):
+        self.text = ""
+        self.scheduled = []
+
+    def index(self, index):
+        assert index == 'end-1c'
+        return f"{self.text.count(chr(10)) + 1}.0"
+
+    def delete(self, start, end):
+        assert start == '1.0'
+        lines = self.text.split("\n")
+        self.text = "\n".join(lines[int(end.split('.')[0]) - 1:])
+
+    def after(self, ms, fn):
+        self.scheduled.append(fn)
+
+
+class FakeElement:
+    def __init__(self):
+        self.Widget = FakeWidget()
+        self.updates = 0
+
+    def update(self, value, append=False):
+        self.updates += 1
+        self.Widget.text = self.Widget.text + value if append else value
+
+
+def test_console_writer(tmp_path):
+    element = FakeElement()
+    log_file = os.path.join(str(tmp_path), "logs", "console.log")
+    writer = ConsoleWriter(element, log_file=log_file, max_lines=3)
+
+    writer.start()
+    try:
+        for i in range(5):
+            print(f"linea {i}")
+        assert sys.stdout is writer
+    finally:
+        writer.stop()
+    assert sys.stdout is not writer
+    assert element.updates == 0
+
+    # pending output is written with a single update and trimmed
+    element.Widget.scheduled.pop()()
+    assert element.updates == 1
+    assert element.Widget.text == "linea 3\nlinea 4\n"
+
+    writer.set("== header ==\n")
+    assert element.Widget.text == "== header ==\n"
+
+    with open(log_file, encoding='utf-8') as f:
+        log = f.read()
+    assert "".join(f"linea {i}\n" for i in range(5)) in log
+
+
+def test_console_writer_log_file(tmp_path, monkeypatch):
+    element = FakeElement()
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("a")
+    os.makedirs("b")
+    log_file = os.path.join("logs", "console.log")
+
+    monkeypatch.chdir("a")
+    writer = ConsoleWriter(element, log_file=log_file, max_bytes=100)
+    writer.write("x" * 60 + "\n")
+    writer.write("y" * 60 + "\n")
+
+    # the log is rotated once it reaches max_bytes
+    writer.write("z" * 10 + "\n")
+    writer.flush()
+    with open(log_file + ".1", encoding='utf-8') as f:
+        assert "y" * 60 in f.read()
+    with open(log_file, encoding='utf-8') as f:
+        assert f.read() == "z" * 10 + "\n"
+
+    # the log is reopened under the new working directory
+    monkeypatch.chdir(os.path.join("..", "b"))
+    writer.open_log(log_file)
+    writer.write("proyecto b\n")
+    writer.stop()
+    with open(log_file, encoding='utf-8') as f:
+        assert f.read().endswith("proyecto b\n")
+    with open(os.path.join("..", "a", log_file), encoding='utf-8') as f:
+        assert "proyecto b" not in f.read()
@@ -8,7 +8,7 @@ from satcfdi.models import Signer, DatePeriod
 from satdigitalinvoice.__version__ import __package__
 from satdigitalinvoice.exceptions import ConsoleErrors
 from satdigitalinvoice.file_data_managers import ClientsManager, FacturasManager
-from satdigitalinvoice.gui_functions import generate_ingresos, periodicidad_desc
+from satdigitalinvoice.gui_functions import generate_ingresos, periodicidad_desc, pago_facturas, group_pagos, saldo_pendiente_pagos
 from satdigitalinvoice.utils import find_best_match
 from tests.utils import verify_result, XElementPrettyPrinter
 
@@ -121,3 +121,98 @@ def test_find_best_match():
         assert find_best_match(cases, DatePeriod(2024, 4, 5))[1] == Decimal('30.00')
         assert find_best_match(cases, DatePeriod(2025, 4, 5))[1] == Decimal('40.00')
         assert find_best_match(cases, DatePeriod(2026, 4, 5))[1] is None
+
+
+def ingreso_ppd(invoice, uuid):
+    class Ingreso(type(invoice)):
+        ultima_num_parcialidad = 0
+
+        def saldo_pendiente(self):
+            return self["Total"]
+
+    i = Ingreso(invoice)
+    i["Complemento"] = {"TimbreFiscalDigital": {"UUID": uuid}}
+    return i
+
+
+def test_pago_facturas():
+    invoices = generate_ingresos(
+        clients=clients,
+        facturas=FacturasManager(ym_date)["Facturas"],
+        dp=date(year=2023, month=4, day=1),
+    )
+    ppd = invoices[1]
+    facturas_pagar = [
+        ingreso_ppd(ppd, "8A49C6A4-70B2-4A51-A0D6-09D3A4A6F7A1"),
+        ingreso_ppd(ppd, "8A49C6A4-70B2-4A51-A0D6-09D3A4A6F7A2"),
+        ingreso_ppd(invoices[2], "8A49C6A4-70B2-4A51-A0D6-09D3A4A6F7A3"),
+    ]
+
+    groups = group_pagos(facturas_pagar)
+    assert [len(g) for g in groups] == [2, 1]
+
+    pago = pago_facturas(
+        facturas_pagar=groups[0],
+        fecha_pago=datetime(2023, 4, 10, 12),
+        forma_pago="03",
+        importe_pago=ppd["Total"] * 2,
+        receptor_cif=clients[ppd["Receptor"]["Rfc"]],
+    )
+    doctos = pago["Complemento"]["Pagos"]["Pago"][0]["DoctoRelacionado"]
+    assert [d["NumParcialidad"] for d in doctos] == [1, 1]
+    assert [d["ImpPagado"] for d in doctos] == [ppd["Total"], ppd["Total"]]
+    assert pago["Complemento"]["Pagos"]["Totales"]["MontoTotalPagos"] == ppd["Total"] * 2
+
+    with pytest.raises(ValueError):
+        pago_facturas(
+            facturas_pagar=groups[0],
+            fecha_pago=datetime(2023, 4, 10, 12),
+            forma_pago="03",
+            importe_pago=ppd["Total"],
+            receptor_cif=clients[ppd["Receptor"]["Rfc"]],
+        )
+
+
+def test_pago_facturas_receptores():
+    invoices = generate_ingresos(
+        clients=clients,
+        facturas=FacturasManager(ym_date)["Facturas"],
+        dp=date(year=2023, month=4, day=1),
+    )
+    facturas_pagar = [
+        ingreso_ppd(invoices[1], "8A49C6A4-70B2-4A51-A0D6-09D3A4A6F7A1"),
+        ingreso_ppd(invoices[2], "8A49C6A4-70B2-4A51-A0D6-09D3A4A6F7A3"),
+    ]
+
+    groups = group_pagos(facturas_pagar)
+    assert [len(g) for g in groups] == [1, 1]
+    assert groups[0][0]["Receptor"]["Rfc"] != groups[1][0]["Receptor"]["Rfc"]
+
+    # batch mode, each invoice is paid its saldo pendiente
+    for group in groups:
+        pago = pago_facturas(
+            facturas_pagar=group,
+            fecha_pago=datetime(2023, 4, 10, 12),
+            forma_pago="03",
+            importe_pago=None,
+            receptor_cif=clients[group[0]["Receptor"]["Rfc"]],
+        )
+        doctos = pago["Complemento"]["Pagos"]["Pago"][0]["DoctoRelacionado"]
+        assert [d["ImpPagado"] for d in doctos] == [group[0]["Total"]]
+
+
+def test_saldo_pendiente_pagos():
+    invoices = generate_ingresos(
+        clients=clients,
+        facturas=FacturasManager(ym_date)["Facturas"],
+        dp=date(year=2023, month=4, day=1),
+    )
+    mxn = ingreso_ppd(invoices[1], "8A49C6A4-70B2-4A51-A0D6-09D3A4A6F7A1")
+    usd = ingreso_ppd(invoices[2], "8A49C6A4-70B2-4A51-A0D6-09D3A4A6F7A3")
+    assert saldo_pendiente_pagos([mxn, usd]) == mxn["Total"] + usd["Total"]
+
+    # amounts in different currencies can't be added up
+    usd["Moneda"] = "USD"
+    assert len(group_pagos([mxn, usd])) == 2
+    with pytest.raises(ValueError):
+        saldo_pendiente_pagos([mxn, usd])
@@ -0,0 +1,135 @@
+import socket
+import time
+
+import pytest
+
+from satdigitalinvoice.email import EmailSender, AttachmentCache, attachment_part, RateLimiter
+from satdigitalinvoice.exceptions import ConsoleErrors
+
+
+class Handler:
+    def __init__(self, fail_first=0):
+        self.fail_first = fail_first
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.fail_first:
+            self.fail_first -= 1
+            return "421 Service not available, closing transmission channel"
+        self.sessions.add(id(session))
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def authenticator(server, session, envelope, mechanism, auth_data):
+    from aiosmtpd.smtp import AuthResult
+    return AuthResult(success=auth_data.login == b"user" and auth_data.password == b"secret")
+
+
+@pytest.fixture
+def smtp_server():
+    aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+    def start(handler):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        controller = aiosmtpd_controller.Controller(
+            handler, hostname="127.0.0.1", port=port, authenticator=authenticator, auth_require_tls=False
+        )
+        controller.start()
+        controllers.append(controller)
+        return port
+
+    controllers = []
+    yield start
+    for c in controllers:
+        c.stop()
+
+
+def sender(port, **kwargs):
+    return EmailSender(host="127.0.0.1", port=port, user="user", password="secret", starttls=False, **({"max_rate": 1000} | kwargs))
+
+
+def test_email_sender_pool(smtp_server):
+    handler = Handler()
+    port = smtp_server(handler)
+
+    with sender(port, max_connections=3) as s:
+        futures = [s.send_email(subject=f"Mensaje {i}", to_addrs=["a@localhost"], html="<p>Hola</p>") for i in range(12)]
+
+    assert all(f.result() == "a@localhost" for f in futures)
+    assert len(handler.messages) == 12
+    assert 1 <= len(handler.sessions) <= 3
+
+
+def test_email_sender_reconnect(smtp_server):
+    handler = Handler(fail_first=1)
+    port = smtp_server(handler)
+
+    with sender(port) as s:
+        s.send_email(subject="Mensaje", to_addrs=["a@localhost"])
+
+    assert len(handler.messages) == 1
+    assert s.stats["retries"] == 1
+    assert s.stats["throttled"] == 1
+    assert s.rate_limiter.rate == pytest.approx(500.02)
+
+
+def test_email_sender_rate_limit(smtp_server):
+    handler = Handler()
+    port = smtp_server(handler)
+
+    with sender(port, max_rate=20, max_connections=2) as s:
+        for i in range(10):
+            s.send_email(subject=f"Mensaje {i}", to_addrs=["a@localhost"])
+
+    # 5 messages in the first burst, the rest at 20 per second
+    assert time.monotonic() - s.started >= 0.2
+    assert s.stats["messages"] == 10
+    assert s.stats["bytes"] > 0
+
+
+def test_email_sender_errors(smtp_server):
+    handler = Handler(fail_first=3)
+    port = smtp_server(handler)
+
+    with pytest.raises(ConsoleErrors) as e:
+        with sender(port) as s:
+            s.send_email(subject="Mensaje", to_addrs=["a@localhost"])
+
+    assert len(e.value.errors) == 1
+    assert e.value.errors[0].startswith("Mensaje: (421")
+
+
+def test_attachment_cache(tmp_path):
+    a = tmp_path / "a.pdf"
+    b = tmp_path / "b.pdf"
+    a.write_bytes(b"a" * 300)
+    b.write_bytes(b"b" * 300)
+
+    cache = AttachmentCache(max_size=500)
+    assert cache.get(a) == cache.get(a)
+    assert cache.stats()["Hits"] == 1
+
+    # a is dropped to keep the cache under max_size
+    cache.get(b)
+    cache.get(a)
+    assert cache.stats() == {"Hits": 1, "Misses": 3, "Size": 406}
+
+    # a modified file is encoded again
+    a.write_bytes(b"c" * 30)
+    assert attachment_part(a).get_payload(decode=True) == b"c" * 30
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(max_rate=1, burst=1, min_rate=0.1, rate_increase=0.2)
+    limiter.throttled()
+    limiter.throttled()
+    assert limiter.rate == 0.25
+    limiter.delivered()
+    assert limiter.rate == pytest.approx(0.45)
+    for _ in range(5):
+        limiter.delivered()
+    assert limiter.rate == 1
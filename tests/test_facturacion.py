@@ -0,0 +1,173 @@
+import hashlib
+import sys
+import time
+import uuid
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+if sys.version_info < (3, 12):
+    pytest.skip("facturacion requires itertools.batched", allow_module_level=True)
+
+from satcfdi.models import Signer, DatePeriod
+from satcfdi.pacs import Document
+
+from satdigitalinvoice import facturacion
+from satdigitalinvoice.facturacion import FacturacionGUI
+from satdigitalinvoice.file_data_managers import ClientsManager, FacturasManager
+from satdigitalinvoice.gui_functions import generate_ingresos
+from satdigitalinvoice.jobs import JobExecutor, JOB_DONE, JOB_PARTIAL
+from satdigitalinvoice.layout import MyTable
+from satdigitalinvoice.localdb import LocalDB
+from satdigitalinvoice.mycfdi import MyCFDI
+from satdigitalinvoice.stamping import sign_fields
+from tests.test_layout import FakeTreeview
+
+csd_signer = Signer.load(
+    certificate=open('csd/cacx7605101p8.cer', 'rb').read(),
+    key=open('csd/cacx7605101p8.key', 'rb').read(),
+    password=open('csd/cacx7605101p8.txt', 'rb').read(),
+)
+
+
+class GUI(FacturacionGUI):
+    # the parts of the GUI used to stamp invoices, without a window
+    def __init__(self, local_db, pac_services):
+        self.local_db = local_db
+        self.pac_services = pac_services
+        self.emisores = {"CACX7605101P8": {"csd": csd_signer}}
+        self.stamp_workers = 1
+        self._all_invoices = None
+        self._invoices_by_date = None
+        self.events = []
+        self.jobs = JobExecutor(on_event=lambda event, value: self.events.append((event, value)))
+
+    def show_console(self):
+        pass
+
+    def wait_jobs(self):
+        # the window would read the events of the finished jobs
+        for _ in range(500):
+            if not self.jobs.running() or any(e == JOB_DONE for e, _ in self.events):
+                break
+            time.sleep(0.01)
+        for event, value in self.events:
+            if event == JOB_PARTIAL:
+                value["job"].deliver(value["value"])
+        self.jobs.collect()
+
+
+def stamped_invoice():
+    invoice = generate_ingresos(
+        clients=ClientsManager(),
+        facturas=FacturasManager(DatePeriod(2023, 4))["Facturas"],
+        dp=date(year=2023, month=4, day=1),
+    )[0]
+    invoice['Serie'] = "A"
+    invoice['Folio'] = "10"
+    invoice.update(sign_fields(invoice, csd_signer))
+
+    payload = invoice.xml_bytes()
+    xml = payload.replace(
+        b'</cfdi:Comprobante>',
+        b'<cfdi:Complemento><tfd:TimbreFiscalDigital xmlns:tfd="http://www.sat.gob.mx/TimbreFiscalDigital" Version="1.1" '
+        b'UUID="' + str(uuid.uuid4()).encode() + b'" FechaTimbrado="2023-04-01T00:00:00" RfcProvCertif="SPR190613I52" '
+        b'SelloCFD="' + invoice['Sello'].encode() + b'" NoCertificadoSAT="30001000000400002495" SelloSAT="sello"/>'
+        b'</cfdi:Complemento></cfdi:Comprobante>'
+    )
+    return payload, xml
+
+
+def test_recover_stamps_fresh_gui(tmp_path, monkeypatch):
+    local_db = LocalDB(base_path=str(tmp_path))
+    monkeypatch.setattr(MyCFDI, "local_db", local_db)
+    monkeypatch.setattr(MyCFDI, "base_dir", str(tmp_path / "archivos"))
+
+    # the app stopped after the PAC stamped the invoice and before it was saved
+    payload, xml = stamped_invoice()
+    local_db.stamp_journal_set(
+        "ref",
+        state="stamped",
+        rfc="CACX7605101P8",
+        folio=10,
+        payload=payload,
+        payload_hash=hashlib.sha256(payload).hexdigest(),
+        document_id="10",
+    )
+    recovered = []
+
+    class PAC:
+        def recover(self, document_id, accept):
+            recovered.append(document_id)
+            return Document(document_id=document_id, xml=xml, pdf=b"%PDF")
+
+    gui = GUI(local_db, {"CACX7605101P8": PAC()})
+    job = gui.recover_stamps()
+    assert gui.recover_stamps() is job
+    gui.wait_jobs()
+    gui.jobs.shutdown()
+
+    assert recovered == ["10"]
+    assert local_db.stamp_journal() == {}
+    cfdi = MyCFDI.from_string(xml)
+    assert cfdi.uuid in gui.get_all_invoices()
+
+
+def test_remove_notified():
+    table = MyTable(key="correos_table", headings=["Rfc"], row_fn=lambda i, r: [r[0]["Rfc"]])
+    table._widget_was_created = lambda: True
+    table.TKTreeview = table.Widget = FakeTreeview()
+    a, b = uuid.uuid4(), uuid.uuid4()
+    table.update([
+        ({"Rfc": "A"}, [SimpleNamespace(uuid=a)], []),
+        ({"Rfc": "B"}, [SimpleNamespace(uuid=b)], []),
+    ])
+    cleared = []
+
+    gui = GUI(local_db=None, pac_services={})
+    gui.window = {"correos_table": table}
+    gui.action_button_manager = SimpleNamespace(name="correos", clear=lambda: cleared.append(True))
+
+    # the delivered rows can't be selected and sent again
+    gui.remove_notified([b])
+    assert [r[0]["Rfc"] for r in table.metadata] == ["A"]
+    assert cleared == [True]
+
+    gui.remove_notified([uuid.uuid4()])
+    assert len(table.metadata) == 1
+    assert cleared == [True]
+
+
+class Element:
+    def __init__(self):
+        self.rows = []
+        self.visible = False
+
+    def update(self, value=None, values=None, visible=None):
+        if values is not None:
+            self.rows = list(values)
+        if visible is not None:
+            self.visible = visible
+
+    def append(self, values):
+        self.rows.extend(values)
+
+
+def test_stream_search_prepare(monkeypatch):
+    monkeypatch.setattr(facturacion, "SEARCH_TIME_BUDGET", 0.05)
+    gui = GUI(local_db=None, pac_services={})
+    gui.invoices_by_date = lambda: []
+    gui._search_rest = {}
+    gui.window = {"emitidas_table": Element(), "emitidas_table_mas": Element()}
+
+    def prepare(job):
+        time.sleep(0.2)  # downloads the listado
+
+    gui.stream_search("buscar", "emitidas_table", lambda job: iter(range(3)), prepare=prepare)
+    gui.wait_jobs()
+    gui.jobs.shutdown()
+
+    # the time spent preparing doesn't count against the budget
+    assert gui.window["emitidas_table"].rows == [0, 1, 2]
+    assert not gui.window["emitidas_table_mas"].visible
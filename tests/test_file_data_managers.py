@@ -0,0 +1,76 @@
+import os
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from jsonschema.exceptions import ValidationError
+from satcfdi.models import DatePeriod
+
+from satdigitalinvoice.file_data_managers import FacturasManager, data_sources, ValidationCache, DataSourceRegistry, client_validator
+
+
+def test_document_parsed_once():
+    assert data_sources.document("facturas.yaml") is data_sources.document("facturas.yaml")
+
+
+def test_data_source_changes(tmp_path):
+    registry = DataSourceRegistry()
+    file_source = tmp_path / "clientes.yaml"
+    file_source.write_text("A: 1\n", encoding="utf-8")
+
+    document = registry.document(file_source)
+    assert registry.changed("clientes_tab", [file_source])
+    assert not registry.changed("clientes_tab", [file_source])
+
+    # same content, new mtime
+    os.utime(file_source, ns=(0, 0))
+    assert registry.changed("clientes_tab", [file_source])
+    assert registry.document(file_source) is document
+
+    file_source.write_text("A: 12\n", encoding="utf-8")
+    assert registry.changed("clientes_tab", [file_source])
+    assert registry.document(file_source) == {"A": 12}
+
+
+def test_facturas_case_resolution():
+    def valor_unitario(dp):
+        return FacturasManager(dp)["Facturas"][0]["Conceptos"][0]["ValorUnitario"]
+
+    assert valor_unitario(DatePeriod(2022, 6)) == Decimal("16950.00")
+    assert valor_unitario(DatePeriod(2023, 4)) == Decimal("18950.00")
+    assert valor_unitario(DatePeriod(2025, 2)) == Decimal("23950.00")
+    assert valor_unitario(None) == {
+        date(2021, 1, 1): Decimal("16950.00"),
+        date(2023, 1, 1): Decimal("18950.00"),
+        date(2025, 1, 1): Decimal("23950.00"),
+    }
+
+
+def test_facturas_are_independent_copies():
+    facturas = FacturasManager(DatePeriod(2023, 4))
+    facturas["Facturas"][0]["Conceptos"][0]["Descripcion"] = "MODIFIED"
+
+    facturas = FacturasManager(DatePeriod(2023, 4))
+    assert facturas["Facturas"][0]["Conceptos"][0]["Descripcion"] == "SOME {{ periodo }}"
+
+
+def test_validation_cache():
+    cache = ValidationCache(client_validator)
+    client = {
+        "RazonSocial": "CACERES XAVIER",
+        "CodigoPostal": "64264",
+        "RegimenFiscal": "612",
+        "IdCIF": "XAXX010101000",
+        "Email": ["emailfake@email.com"],
+    }
+
+    cache.validate(client)
+    cache.validate(dict(client))
+    assert cache.stats() == {"Hits": 1, "Misses": 1}
+
+    client["CodigoPostal"] = 64264
+    with pytest.raises(ValidationError):
+        cache.validate(client)
+    with pytest.raises(ValidationError):
+        cache.validate(client)
+    assert cache.stats() == {"Hits": 1, "Misses": 3}
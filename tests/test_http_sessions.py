@@ -0,0 +1,70 @@
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from satdigitalinvoice.http_sessions import HTTPSessions, patch_module
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = set()
+
+    def do_GET(self):
+        Handler.connections.add(self.client_address)
+        status = 404 if self.path == "/missing" else 200
+        self.send_response(status)
+        if self.path == "/cookie":
+            self.send_header("Set-Cookie", "session=abc; Path=/")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+def test_http_sessions(server):
+    Handler.connections.clear()
+    sessions = HTTPSessions(host_adapters={})
+    for _ in range(5):
+        assert sessions.get(f"http://{server}/").text == "ok"
+    sessions.get(f"http://{server}/missing")
+
+    # the connection is kept alive
+    assert len(Handler.connections) == 1
+
+    stats = sessions.stats()[server]
+    assert stats["Requests"] == 6
+    assert stats["Errors"] == 1
+
+
+def test_patch_module(server):
+    sessions = HTTPSessions(host_adapters={})
+    module = SimpleNamespace(requests=requests)
+    patch_module(module, sessions)
+
+    assert module.requests.get(f"http://{server}/").text == "ok"
+    with module.requests.Session() as s:
+        s.mount("http://", None)
+        assert s.get(f"http://{server}/").text == "ok"
+    assert module.requests.exceptions is requests.exceptions
+    assert sessions.stats()[server]["Requests"] == 2
+
+
+def test_http_sessions_cookies(server):
+    sessions = HTTPSessions(host_adapters={})
+    assert sessions.get(f"http://{server}/cookie").text == "ok"
+    assert len(sessions.session.cookies) == 0
+    assert sessions.stats()[server]["Requests"] == 1
@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+
+from satdigitalinvoice.jobs import JobExecutor, JOB_DONE, JOB_PRINT, JOB_PROGRESS, JOB_PARTIAL
+
+
+class Events:
+    def __init__(self):
+        self.events = []
+        self.done = threading.Semaphore(0)
+
+    def __call__(self, event, value):
+        self.events.append((event, value))
+        if event == JOB_DONE:
+            self.done.release()
+
+    def wait(self, n=1):
+        for _ in range(n):
+            assert self.done.acquire(timeout=5)
+
+    def of(self, event):
+        return [v for e, v in self.events if e == event]
+
+
+def test_jobs_run_concurrently():
+    events = Events()
+    executor = JobExecutor(on_event=events)
+    barrier = threading.Barrier(2, timeout=5)
+    results = []
+
+    def work(job, value):
+        barrier.wait()  # both jobs must be running at the same time
+        job.print("trabajando", value)
+        return value
+
+    executor.submit("a", work, 1, on_done=results.append)
+    executor.submit("b", work, 2, on_done=results.append)
+    with pytest.raises(ValueError):
+        executor.submit("a", work, 3)
+
+    events.wait(2)
+    assert {j.name for j in executor.collect()} == {"a", "b"}
+    assert sorted(results) == [1, 2]
+    assert sorted(events.of(JOB_PRINT)) == ["trabajando 1", "trabajando 2"]
+    assert executor.running() == []
+    executor.shutdown()
+
+
+def test_job_cancel():
+    events = Events()
+    executor = JobExecutor(on_event=events)
+    started = threading.Event()
+    results = []
+
+    def work(job):
+        for i in job.iterate(range(1000)):
+            started.set()
+            threading.Event().wait(0.01)
+        return "fin"
+
+    job = executor.submit("a", work, on_done=results.append)
+    assert started.wait(5)
+    progress = events.of(JOB_PROGRESS)[0]
+    assert progress["job"] is job and progress["total"] == 1000
+
+    job.cancel()
+    events.wait()
+    executor.collect()
+    assert results == []
+
+    # a cancelled job can be replaced right away
+    executor.submit("a", lambda j: "otro", on_done=results.append)
+    events.wait()
+    executor.collect()
+    assert results == ["otro"]
+    executor.shutdown()
+
+
+def test_job_error():
+    events = Events()
+    executor = JobExecutor(on_event=events)
+    results = []
+
+    def fail(job):
+        raise ValueError("error")
+
+    executor.submit("a", fail)
+    executor.submit("b", lambda j: "ok", on_done=results.append)
+    events.wait(2)
+
+    with pytest.raises(ValueError, match="error"):
+        executor.collect()
+    assert results == ["ok"]
+    executor.shutdown()
+
+
+def test_job_partial():
+    events = Events()
+    executor = JobExecutor(on_event=events)
+    rows = []
+
+    def work(job):
+        for batch in ([1, 2], [3]):
+            job.partial(batch)
+        return "fin"
+
+    job = executor.submit("a", work, on_partial=rows.extend)
+    events.wait()
+    for p in events.of(JOB_PARTIAL):
+        p["job"].deliver(p["value"])
+    assert rows == [1, 2, 3]
+
+    # batches of a cancelled job are dropped
+    job.cancel()
+    job.deliver([4])
+    assert rows == [1, 2, 3]
+    executor.shutdown()
@@ -0,0 +1,297 @@
+from satdigitalinvoice.layout import MyTable
+
+
+class FakeTreeview:
+    # the parts of ttk.Treeview used by sg.Table and MyTable, no display needed
+    def __init__(self):
+        self.rows = {}
+        self.selected = ()
+        self.scroll_command = "scrollbar set"
+        self.scrolled = []
+        self.idle = []
+        self.view = (0.0, 1.0)
+        self.tk = self
+
+    def get_children(self):
+        return tuple(self.rows)
+
+    def insert(self, parent, index, text, iid, values, tag):
+        self.rows[str(iid)] = values
+        return str(iid)
+
+    def item(self, iid, values=None, text=None, tags=None):
+        if values is not None:
+            self.rows[str(iid)] = values
+
+    def detach(self, iid):
+        pass
+
+    def delete(self, iid):
+        del self.rows[iid]
+
+    def tag_configure(self, tag, **kwargs):
+        pass
+
+    def selection(self):
+        return self.selected
+
+    def selection_set(self, items):
+        self.selected = tuple(str(i) for i in items)
+
+    def selection_add(self, items):
+        self.selected += tuple(str(i) for i in items)
+
+    def cget(self, option):
+        assert option == 'yscrollcommand'
+        return self.scroll_command
+
+    def configure(self, yscrollcommand):
+        self.yscrollcommand = yscrollcommand
+
+    def call(self, *args):
+        self.scrolled.append(args)
+
+    def after_idle(self, fn):
+        self.idle.append(fn)
+
+    def yview(self):
+        return self.view
+
+    def select(self, rows):
+        # user selection, tkinter calls back the element
+        self.selection_set(r + 1 for r in rows)
+
+
+def make_table(render_batch=10):
+    formatted = []
+
+    def row_fn(i, item):
+        formatted.append(i)
+        return [i, item["n"]]
+
+    table = MyTable(key="table", headings=["#", "n"], row_fn=row_fn, render_batch=render_batch)
+    table._widget_was_created = lambda: True
+    table.TKTreeview = table.Widget = FakeTreeview()
+    table.ChangeSubmits = False
+    return table, formatted
+
+
+def items(n):
+    return [{"n": i} for i in range(n)]
+
+
+def select(table, rows):
+    table.TKTreeview.select(rows)
+    table._treeview_selected(None)
+
+
+def test_table_update():
+    table, formatted = make_table()
+    tree = table.TKTreeview
+    values = items(35)
+
+    table.update(values)
+    assert table.metadata is values
+    assert table.rendered == 10
+    assert formatted == list(range(1, 11))
+    assert list(tree.rows) == [str(i) for i in range(1, 11)]
+    assert table.Values == [[i + 1, i] for i in range(10)]
+
+    # selected rows beyond the first batch are rendered
+    table.update(items(35), select_rows=[14])
+    assert table.rendered == 15
+    assert tree.selection() == ("15",)
+
+    table.update(items(3))
+    assert table.rendered == 3
+    assert len(tree.rows) == 3
+
+
+def test_table_render_on_scroll():
+    table, formatted = make_table()
+    tree = table.TKTreeview
+    table.update(items(25))
+    assert tree.yscrollcommand == table._on_yscroll
+
+    # the scrollbar keeps working and nothing is rendered away from the end
+    tree.yscrollcommand("0.0", "0.5")
+    assert tree.scrolled == [("scrollbar set", "0.0", "0.5")]
+    assert tree.idle == []
+
+    # the next batch is rendered once when idle
+    tree.yscrollcommand("0.5", "0.95")
+    tree.yscrollcommand("0.5", "0.96")
+    assert len(tree.idle) == 1
+    tree.idle.pop()()
+    assert table.rendered == 20
+    assert list(tree.rows) == [str(i) for i in range(1, 21)]
+    assert table.Values[10:] == [[i + 1, i] for i in range(10, 20)]
+
+    tree.yscrollcommand("0.8", "1.0")
+    tree.idle.pop()()
+    assert table.rendered == 25
+    assert formatted == list(range(1, 26))
+
+    # everything is rendered
+    tree.yscrollcommand("0.8", "1.0")
+    assert tree.idle == []
+
+    # the scroll hook is installed once
+    table.update(items(5))
+    assert tree.cget('yscrollcommand') == "scrollbar set"
+    assert table._scroll_command == "scrollbar set"
+
+
+def test_table_render_to():
+    table, formatted = make_table()
+    table.update(items(15))
+    formatted.clear()
+
+    table._render_to(100)
+    assert table.rendered == 15
+    assert formatted == list(range(11, 16))
+    assert len(table.TKTreeview.rows) == 15
+    assert len(table.tree_ids) == len(table.Values) == 15
+
+    # already rendered
+    table._render_to(12)
+    assert table.rendered == 15
+    assert formatted == list(range(11, 16))
+
+
+def test_table_append():
+    table, formatted = make_table()
+    tree = table.TKTreeview
+    table.update([])
+
+    # the first batch is rendered right away
+    table.append(items(4))
+    assert table.rendered == 4
+    table.append(items(20))
+    assert table.rendered == 14
+    assert len(table.metadata) == 24
+
+    # away from the end the new rows wait for the scroll
+    tree.view = (0.0, 0.5)
+    table.append(items(10))
+    assert table.rendered == 14
+    assert len(table.metadata) == 34
+
+    tree.view = (0.5, 1.0)
+    table.append(items(1))
+    assert table.rendered == 24
+    assert len(table.metadata) == 35
+    assert formatted == list(range(1, 25))
+
+
+def test_table_select_all():
+    table, _ = make_table()
+    tree = table.TKTreeview
+    values = items(25)
+    table.update(values)
+
+    table.select_all()
+    assert table.all_selected
+    assert tree.selection() == tuple(str(i) for i in range(1, 11))
+
+    # the selection event keeps all_selected, every item is selected not only the rendered ones
+    table._treeview_selected(None)
+    assert table.all_selected
+    assert table.selected_items() == values
+
+    # rows rendered later are selected too
+    table._render_to(20)
+    assert tree.selection() == tuple(str(i) for i in range(1, 21))
+    table._treeview_selected(None)
+    assert table.all_selected
+
+    # unselecting any row ends it
+    select(table, [0, 2])
+    assert not table.all_selected
+    assert table.selected_items() == [values[0], values[2]]
+
+    # new values end it
+    table.select_all()
+    table.update(items(25))
+    assert not table.all_selected
+
+
+def test_table_delete_selected():
+    table, _ = make_table()
+    values = items(25)
+    table.update(values)
+
+    select(table, [0, 2])
+    table.delete_selected()
+    assert table.metadata == values[1:2] + values[3:]
+    assert table.rendered == 10
+    assert table.SelectedRows == []
+
+    table.select_all()
+    table.delete_selected()
+    assert table.metadata == []
+    assert table.rendered == 0
+    assert table.TKTreeview.rows == {}
+
+
+def test_table_refresh():
+    table, formatted = make_table()
+    tree = table.TKTreeview
+    values = items(25)
+    table.update(values)
+    table._render_to(20)
+
+    select(table, [1, 15])
+    values[15]["n"] = "cambio"
+    formatted.clear()
+
+    # the rendered extent and the selection are kept
+    table.refresh()
+    assert table.metadata is values
+    assert table.rendered == 20
+    assert formatted == list(range(1, 21))
+    assert tree.rows["16"] == [16, "cambio"]
+    assert tree.selection() == ("2", "16")
+
+    table.select_all()
+    table.refresh()
+    assert table.all_selected
+    assert table.selected_items() == values
+
+
+def test_table_update_rows():
+    table, formatted = make_table()
+    tree = table.TKTreeview
+    values = items(25)
+    table.update(values)
+    formatted.clear()
+
+    values[2]["n"] = "cambio"
+    values[20]["n"] = "cambio"
+    table.update_rows([2, 20])
+
+    # rows not rendered yet are formatted when reached
+    assert formatted == [3]
+    assert tree.rows["3"] == [3, "cambio"]
+    assert table.Values[2] == [3, "cambio"]
+    assert len(tree.rows) == len(table.Values) == 10
+
+    table._render_to(25)
+    assert tree.rows["21"] == [21, "cambio"]
+
+
+def test_table_update_items():
+    table, formatted = make_table()
+    tree = table.TKTreeview
+    values = items(25)
+    table.update(values)
+    formatted.clear()
+
+    # items are matched by identity, an equal copy is not updated
+    values[1]["n"] = "cambio"
+    values[4]["n"] = "cambio"
+    table.update_items([values[1], dict(values[4]), values[22]])
+    assert formatted == [2]
+    assert tree.rows["2"] == [2, "cambio"]
+    assert tree.rows["5"] == [5, 4]
+    assert table.Values[4] == [5, 4]
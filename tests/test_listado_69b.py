@@ -0,0 +1,40 @@
+import os
+import time
+
+from satcfdi.pacs import TaxpayerStatus
+
+from satdigitalinvoice.listado_69b import Listado69B
+
+
+def test_listado_69b(tmp_path):
+    downloads = []
+
+    def download():
+        downloads.append(1)
+        if len(downloads) > 2:
+            raise ConnectionError()
+        return {"AAA010101AAA": "Definitivo", "BBB010101BBB": "Desvirtuado"}
+
+    filename = str(tmp_path / "listado_69b.pickle")
+    listado = Listado69B(filename=filename, refresh_time=60, download=download)
+    assert listado.status("AAA010101AAA") == TaxpayerStatus.DEFINITIVO
+    assert listado.status("CCC010101CCC") is None
+    assert listado.screen(["BBB010101BBB", "CCC010101CCC", "BBB010101BBB"]) == {"BBB010101BBB": TaxpayerStatus.DESVIRTUADO}
+    assert len(downloads) == 1
+
+    # loaded from disk by a new process
+    assert Listado69B(filename=filename, refresh_time=60, download=download).status("AAA010101AAA") == TaxpayerStatus.DEFINITIVO
+    assert len(downloads) == 1
+
+    # refreshed by age, a failed download keeps the snapshot
+    old = time.time() - 120
+    os.utime(filename, (old, old))
+    listado = Listado69B(filename=filename, refresh_time=60, download=download)
+    assert listado.status("AAA010101AAA") == TaxpayerStatus.DEFINITIVO
+    assert len(downloads) == 2
+
+    os.utime(filename, (old, old))
+    listado = Listado69B(filename=filename, refresh_time=60, download=download)
+    assert listado.status("AAA010101AAA") == TaxpayerStatus.DEFINITIVO
+    assert listado.status("AAA010101AAA") == TaxpayerStatus.DEFINITIVO
+    assert len(downloads) == 3
@@ -23,3 +23,24 @@ def test_localdb():
     assert db.load_data('test_save_data') == a
 
 
+def test_email_token(tmp_path, monkeypatch):
+    refreshes = []
+
+    def token_refresh(refresh_token, **kwargs):
+        refreshes.append(refresh_token)
+        return {"access_token": f"access{len(refreshes)}", "refresh_token": "refresh", "expires_in": 3600}
+
+    monkeypatch.setattr("satdigitalinvoice.localdb.token_refresh", token_refresh)
+
+    db = LocalDB(base_path=str(tmp_path))
+    db.set_email_token({"access_token": "access0", "refresh_token": "refresh"})
+
+    assert db.get_email_token()["access_token"] == "access1"
+    assert db.get_email_token()["access_token"] == "access1"
+    assert db.get_email_token(force_refresh=True)["access_token"] == "access2"
+    assert len(refreshes) == 2
+
+    # refreshed again near its expiration
+    db.set_email_token({"access_token": "stale", "refresh_token": "refresh", "expires_in": 60})
+    assert db.get_email_token()["access_token"] == "access3"
+    assert len(refreshes) == 3
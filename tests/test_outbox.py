@@ -0,0 +1,140 @@
+import smtplib
+import threading
+import time
+from concurrent.futures import Future
+from uuid import UUID
+
+from satdigitalinvoice.exceptions import ConsoleErrors
+from satdigitalinvoice.localdb import LocalDB
+from satdigitalinvoice.outbox import Outbox
+
+UUID1 = UUID("8a49c6a4-70b2-4a51-a0d6-09d3a4a6f7a1")
+
+
+class FakeSender:
+    def __init__(self, failing_subjects=(), error=lambda: ConnectionError("SMTP Error")):
+        self.failing_subjects = failing_subjects
+        self.error = error
+        self.sent = []
+        self.futures = []
+
+    def __enter__(self):
+        self.futures = []
+        return self
+
+    def __exit__(self, exc_type, exc, exc_tb):
+        if any(f.exception() for f in self.futures):
+            raise ConsoleErrors("Errores al enviar correos", errors=[])
+
+    def send_email(self, subject, to_addrs, html=None, file_attachments=None):
+        future = Future()
+        if subject in self.failing_subjects:
+            future.set_exception(self.error())
+        else:
+            self.sent.append(subject)
+            future.set_result(to_addrs)
+        self.futures.append(future)
+        return future
+
+
+def test_outbox(tmp_path):
+    local_db = LocalDB(base_path=str(tmp_path))
+    sender = FakeSender(failing_subjects=["B"])
+    events = []
+    outbox = Outbox(local_db, sender, on_event=lambda e, m: events.append((e, m["subject"])), backoff=10)
+
+    a = outbox.enqueue("A", ["a@localhost"], html="<p>A</p>", notify=[UUID1])
+    assert outbox.enqueue("A", ["a@localhost"], html="<p>A</p>", notify=[UUID1]) == a
+    outbox.enqueue("B", ["b@localhost"], file_attachments=iter(["b.pdf"]))
+    assert outbox.pending() == 2
+    assert outbox.pending_notify() == {UUID1}
+
+    outbox.deliver()
+    assert sender.sent == ["A"]
+    assert local_db.notified2(UUID1) is True
+    assert outbox.pending_notify() == set()
+    assert events == [("outbox_delivered", "A"), ("outbox_failed", "B")]
+
+    [failed] = local_db.outbox().values()
+    assert failed["attempts"] == 1
+    assert failed["file_attachments"] == ["b.pdf"]
+    assert failed["next_attempt"] > time.time() + 5
+
+    # not due yet
+    outbox.deliver()
+    assert len(events) == 2
+
+    sender.failing_subjects = []
+    local_db.outbox_set(next(iter(local_db.outbox())), next_attempt=0)
+    outbox.deliver()
+    assert sender.sent == ["A", "B"]
+    assert outbox.pending() == 0
+
+
+def test_outbox_rejected(tmp_path):
+    local_db = LocalDB(base_path=str(tmp_path))
+    sender = FakeSender(
+        failing_subjects=["A"],
+        error=lambda: smtplib.SMTPRecipientsRefused({"a@localhost": (550, b"5.1.1 User unknown")})
+    )
+    events = []
+    outbox = Outbox(local_db, sender, on_event=lambda e, m: events.append((e, m["subject"])), backoff=0, permanent_attempts=2)
+
+    outbox.enqueue("A", ["a@localhost"], html="<p>A</p>")
+    outbox.deliver()
+    assert outbox.pending() == 1
+
+    # permanent errors stop being retried after permanent_attempts
+    outbox.deliver()
+    assert outbox.pending() == 0
+    assert events == [("outbox_failed", "A"), ("outbox_rejected", "A")]
+
+
+def test_outbox_stop_hands_over(tmp_path):
+    local_db = LocalDB(base_path=str(tmp_path))
+    submitted = threading.Semaphore(0)
+
+    class QueuedSender(FakeSender):
+        # messages are sent by the test, leaving the block waits for them
+        def send_email(self, subject, to_addrs, html=None, file_attachments=None):
+            future = Future()
+            future.subject = subject
+            self.futures.append(future)
+            submitted.release()
+            return future
+
+        def __exit__(self, exc_type, exc, exc_tb):
+            while not all(f.done() for f in self.futures):
+                time.sleep(0.01)
+
+    sender = QueuedSender()
+    outbox = Outbox(local_db, sender, poll=0.01)
+    outbox.enqueue("A", ["a@localhost"], html="<p>A</p>")
+    outbox.enqueue("B", ["b@localhost"], html="<p>B</p>")
+    outbox.start()
+    assert submitted.acquire(timeout=5) and submitted.acquire(timeout=5)
+    in_flight, queued = sender.futures
+    assert in_flight.set_running_or_notify_cancel()
+
+    # stop doesn't wait for the message in flight, the queued one is cancelled
+    outbox.stop()
+    assert queued.cancelled()
+    assert outbox.thread.is_alive()
+
+    # the next outbox starts once the message in flight is finished
+    next_sender = FakeSender()
+    next_outbox = Outbox(local_db, next_sender, poll=0.01)
+    next_outbox.start(outbox)
+    time.sleep(0.1)
+    assert next_sender.sent == []
+
+    in_flight.set_result(["a@localhost"])
+    outbox.join(5)
+    for _ in range(500):
+        if not next_outbox.pending():
+            break
+        time.sleep(0.01)
+    next_outbox.stop()
+    next_outbox.join(5)
+    assert next_sender.sent == ["B"]
+    assert next_outbox.pending() == 0
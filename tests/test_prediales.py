@@ -0,0 +1,75 @@
+import sys
+
+import pytest
+
+if sys.version_info < (3, 12):
+    pytest.skip("prediales requires itertools.batched", allow_module_level=True)
+
+from satcfdi.exceptions import ResponseError
+
+from satdigitalinvoice import prediales
+from satdigitalinvoice.prediales import process_prediales
+
+
+class Response:
+    def __init__(self, json=None, content=b""):
+        self._json = json
+        self.content = content
+        self.status_code = 200
+
+    def json(self):
+        return self._json
+
+
+class FakeSession:
+    def __init__(self):
+        self.adeudo = 1
+        self.fail_download = False
+        self.pdfs = []
+
+    def post(self, url, data, timeout):
+        return Response(json={"datosEdoCta": {"K_ADEUDO": self.adeudo, "CVE": data["cveCatastral"]}})
+
+    def get(self, url, timeout):
+        self.pdfs.append(url)
+        r = Response(content=f"%PDF {self.adeudo}".encode())
+        if self.fail_download:
+            r.status_code = 500
+        return r
+
+
+def test_process_prediales(tmp_path, monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr(prediales, "session", session)
+    cuentas = ["001001001", "001001002"]
+
+    assert [f.result() for f in process_prediales(str(tmp_path), cuentas)] == [True, True]
+    assert (tmp_path / "001001001.pdf").read_bytes() == b"%PDF 1"
+
+    # same adeudo, the estados de cuenta are not downloaded again
+    assert [f.result() for f in process_prediales(str(tmp_path), cuentas)] == [False, False]
+
+    (tmp_path / "001001002.pdf").unlink()
+    assert [f.result() for f in process_prediales(str(tmp_path), cuentas)] == [False, True]
+
+    session.adeudo = 2
+    assert [f.result() for f in process_prediales(str(tmp_path), cuentas)] == [True, True]
+    assert len(session.pdfs) == 5
+
+
+def test_process_predial_failed_download(tmp_path, monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr(prediales, "session", session)
+    folder = str(tmp_path)
+
+    assert prediales.process_predial(folder, "001001001")
+
+    # the new adeudo is not recorded until its estado de cuenta is saved
+    session.adeudo, session.fail_download = 2, True
+    with pytest.raises(ResponseError):
+        prediales.process_predial(folder, "001001001")
+    assert prediales.previous_adeudo(str(tmp_path / "001001001.yaml")) == 1
+
+    session.fail_download = False
+    assert prediales.process_predial(folder, "001001001")
+    assert (tmp_path / "001001001.pdf").read_bytes() == b"%PDF 2"
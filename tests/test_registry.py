@@ -0,0 +1,27 @@
+from satdigitalinvoice.registry import ConfigObjectCache, load_emisores
+
+
+def test_config_object_cache():
+    built = []
+    cache = ConfigObjectCache(lambda config: built.append(config) or dict(config))
+
+    a = cache.get("AAA010101AAA", {"type": "diverza.Diverza", "args": {"id": "1"}})
+    b = cache.get("BBB010101BBB", {"type": "diverza.Diverza", "args": {"id": "2"}})
+    assert cache.get("AAA010101AAA", {"args": {"id": "1"}, "type": "diverza.Diverza"}) is a
+    assert cache.get("BBB010101BBB", {"type": "diverza.Diverza", "args": {"id": "3"}}) is not b
+    assert len(built) == 3
+
+
+def test_load_emisores():
+    csd = {
+        "certificate": open('csd/cacx7605101p8.cer', 'rb').read(),
+        "key": open('csd/cacx7605101p8.key', 'rb').read(),
+        "password": open('csd/cacx7605101p8.txt', 'rb').read(),
+    }
+    config = {"emisores": {"CACX7605101P8": {"csd": csd}}}
+
+    emisores = load_emisores(config)
+    assert emisores["CACX7605101P8"]["csd"].rfc == "CACX7605101P8"
+    assert emisores["CACX7605101P8"]["fiel"] is None
+    assert load_emisores(config)["CACX7605101P8"]["csd"] is emisores["CACX7605101P8"]["csd"]
+    assert load_emisores({}) is None
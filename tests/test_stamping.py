@@ -0,0 +1,162 @@
+from datetime import date
+from types import SimpleNamespace
+
+from satcfdi.exceptions import ResponseError
+from satcfdi.models import Signer, DatePeriod
+from satcfdi.pacs import Document
+
+from satdigitalinvoice.file_data_managers import ClientsManager, FacturasManager
+from satdigitalinvoice.gui_functions import generate_ingresos
+from satdigitalinvoice.localdb import LocalDB
+from satdigitalinvoice.stamping import StampingPipeline
+
+csd_config = {
+    "certificate": open('csd/cacx7605101p8.cer', 'rb').read(),
+    "key": open('csd/cacx7605101p8.key', 'rb').read(),
+    "password": open('csd/cacx7605101p8.txt', 'rb').read(),
+}
+csd_signer = Signer.load(**csd_config)
+
+
+def rejected():
+    return ResponseError(SimpleNamespace(status_code=400, text="CFDI invalido"))
+
+
+class FakePAC:
+    def __init__(self, failing_receptores, error=lambda: ValueError("PAC Error")):
+        self.failing_receptores = failing_receptores
+        self.error = error
+        self.ref_ids = []
+
+    def stamp(self, cfdi, accept, ref_id):
+        self.ref_ids.append(ref_id)
+        if cfdi["Receptor"]["Rfc"] in self.failing_receptores:
+            raise self.error()
+        return Document(document_id=cfdi["Folio"], xml=cfdi.xml_bytes())
+
+
+def stamp(tmp_path, failing_receptores, error=rejected, **kwargs):
+    local_db = LocalDB(base_path=str(tmp_path))
+    local_db.serie_set("A")
+    local_db.folio_set(10)
+
+    invoices = generate_ingresos(
+        clients=ClientsManager(),
+        facturas=FacturasManager(DatePeriod(2023, 4))["Facturas"],
+        dp=date(year=2023, month=4, day=1),
+    )
+    pac = FakePAC(failing_receptores, error)
+    pipeline = StampingPipeline(
+        local_db=local_db,
+        emisores={"CACX7605101P8": {"csd": csd_signer}},
+        pac_services={"CACX7605101P8": pac},
+        attempts=2,
+        retry_delay=0,
+        **kwargs
+    )
+    pipeline.submit(invoices)
+    results = [pipeline.result(i) for i in range(len(invoices))]
+    return local_db, pipeline, results, pac
+
+
+def test_stamping_pipeline(tmp_path):
+    local_db, pipeline, results, pac = stamp(tmp_path, failing_receptores=[])
+
+    assert [r.folio for r in results] == [10, 11, 12]
+    assert [r.document.document_id for r in results] == ["10", "11", "12"]
+    assert all(r.invoice["Sello"] for r in results)
+    assert pipeline.release_folios(results) == []
+    assert local_db.folio() == 13
+
+
+def test_stamping_pipeline_failed_last(tmp_path):
+    local_db, pipeline, results, pac = stamp(tmp_path, failing_receptores=["ABMG891115PD7"])
+
+    assert [bool(r.document) for r in results] == [True, True, False]
+    # rejected by the PAC, it is not sent again
+    assert len(results[2].errors) == 1
+    assert len(pac.ref_ids) == 3
+
+    # the failed folio is at the end of the block, it is given back
+    assert pipeline.release_folios(results) == []
+    assert local_db.folio() == 12
+
+
+def test_stamping_pipeline_failed_middle(tmp_path):
+    local_db, pipeline, results, pac = stamp(tmp_path, failing_receptores=["ABC1511034U3"])
+
+    assert [bool(r.document) for r in results] == [True, False, True]
+    assert pipeline.release_folios(results) == [11]
+    assert local_db.folio() == 13
+    assert local_db.folios_sin_usar() == ["A11"]
+
+
+def test_stamping_pipeline_journal(tmp_path):
+    local_db, pipeline, results, pac = stamp(tmp_path, failing_receptores=["ABMG891115PD7"])
+
+    # the rejected request is not kept, its folio is released
+    journal = local_db.stamp_journal()
+    assert sorted(journal) == sorted(r.ref_id for r in results[:2])
+    assert all(e["state"] == "stamped" for e in journal.values())
+    assert [journal[r.ref_id]["xml"] for r in results[:2]] == [r.document.xml for r in results[:2]]
+
+    pipeline.complete(results[0])
+    assert list(local_db.stamp_journal()) == [results[1].ref_id]
+
+
+def test_stamping_pipeline_unresolved(tmp_path):
+    # the PAC may have stamped the invoice before the connection failed
+    local_db, pipeline, results, pac = stamp(tmp_path, failing_receptores=["ABC1511034U3"], error=lambda: ConnectionError("Reset"))
+    failed = results[1]
+
+    assert [bool(r.document) for r in results] == [True, False, True]
+    assert failed.unresolved
+    assert len(pac.ref_ids) == 4
+
+    # the request is kept and its folio is neither released nor recorded as unused
+    assert local_db.stamp_journal()[failed.ref_id]["state"] == "signed"
+    assert pipeline.release_folios(results) == []
+    assert local_db.folio() == 13
+    assert local_db.folios_sin_usar() == []
+
+    # recovered with the same payload and ref_id
+    pac.failing_receptores = []
+    recovered = {r.ref_id: r for r in pipeline.recover()}
+    assert recovered[failed.ref_id].document.xml == failed.invoice.xml_bytes()
+    assert pac.ref_ids[-1] == failed.ref_id
+
+
+def test_stamping_pipeline_recover_rejected(tmp_path):
+    local_db, pipeline, results, pac = stamp(tmp_path, failing_receptores=["ABC1511034U3"], error=lambda: ConnectionError("Reset"))
+    failed = results[1]
+
+    pac.error = rejected
+    recovered = {r.ref_id: r for r in pipeline.recover()}
+    assert not recovered[failed.ref_id].document
+    assert failed.ref_id not in local_db.stamp_journal()
+    assert local_db.folios_sin_usar() == ["A11"]
+
+
+def test_stamping_pipeline_recover(tmp_path):
+    local_db, pipeline, results, pac = stamp(tmp_path, failing_receptores=[])
+    stamped, signed = results[0], results[1]
+    pipeline.complete(results[2])
+
+    # simulates a crash while the second invoice was being sent
+    local_db.stamp_journal_set(signed.ref_id, state="signed")
+    pac.ref_ids.clear()
+    pac.recover = lambda document_id, accept: Document(document_id=document_id, xml=b"<recovered/>")
+
+    # the stamped invoice is taken from the journal without calling the PAC
+    recovered = {r.ref_id: r for r in pipeline.recover()}
+    assert recovered[stamped.ref_id].document.xml == stamped.document.xml
+    assert recovered[signed.ref_id].document.xml == signed.invoice.xml_bytes()
+    assert recovered[signed.ref_id].folio == 11
+    assert pac.ref_ids == [signed.ref_id]
+    assert local_db.folio() == 13
+
+    # entries without the xml are downloaded again
+    local_db.stamp_journal_set(stamped.ref_id, xml=None)
+    recovered = {r.ref_id: r for r in pipeline.recover()}
+    assert recovered[stamped.ref_id].document.xml == b"<recovered/>"
+    assert recovered[signed.ref_id].document.xml == signed.invoice.xml_bytes()
@@ -0,0 +1,59 @@
+from decimal import Decimal
+
+import pytest
+import yaml
+from yaml.constructor import ConstructorError
+
+from satdigitalinvoice.file_data_managers import DuplicateKeySafeLoader, FastDuplicateKeySafeLoader, Case, CParser
+
+pytestmark = pytest.mark.skipif(CParser is None, reason="libyaml is not available")
+
+
+def typed(data):
+    # Decimal('1.5') == 1.5, compare types too
+    if isinstance(data, dict):
+        return type(data), {k: typed(v) for k, v in data.items()}
+    if isinstance(data, list):
+        return type(data), [typed(v) for v in data]
+    return type(data), data
+
+
+def load_both(content):
+    return yaml.load(content, DuplicateKeySafeLoader), yaml.load(content, FastDuplicateKeySafeLoader)
+
+
+@pytest.mark.parametrize("file_source", [
+    "config.yaml",
+    "clientes.yaml",
+    "facturas.yaml",
+    "facturas_duplicated.yaml",
+    "productos.yaml",
+])
+def test_same_result(file_source):
+    with open(file_source, "r", encoding="utf-8") as fs:
+        content = fs.read()
+
+    pure, fast = load_both(content)
+    assert typed(pure) == typed(fast)
+
+
+def test_decimal_and_tags():
+    pure, fast = load_both("a: 1.50\nb: 2\nc: '3.5'\nd: !case\n  '2023-01': 1.0\n")
+    assert typed(pure) == typed(fast)
+    assert type(fast["a"]) is Decimal and fast["a"] == Decimal("1.50")
+    assert type(fast["b"]) is int
+    assert type(fast["c"]) is str
+    assert type(fast["d"]) is Case
+
+
+@pytest.mark.parametrize("loader", [DuplicateKeySafeLoader, FastDuplicateKeySafeLoader])
+def test_duplicated_key(loader):
+    with pytest.raises(ConstructorError) as e:
+        yaml.load("a: 1\nb:\n  c: 1\n  c: 2\n", loader)
+    assert e.value.problem == "found duplicate key (c)"
+
+
+@pytest.mark.parametrize("loader", [DuplicateKeySafeLoader, FastDuplicateKeySafeLoader])
+def test_invalid_decimal(loader):
+    with pytest.raises(ConstructorError):
+        yaml.load("a: !decimal abc\n", loader)